@@ -1,6 +1,7 @@
 from typing import List
 from models import SearchQuery, SearchResult, SearchResponse
 from memory import MemoryManager
+from metrics import stage
 from logger_config import setup_logger
 
 # Set up logger
@@ -11,39 +12,79 @@ def execute_search(
     memory: MemoryManager
 ) -> SearchResponse:
     """Execute the search and return formatted results."""
-    logger.info(f"Executing search for query: {query.query_text}")
+    logger.debug("Executing search for query: %s", query.query_text)
     
     # Perform the search
-    results = memory.search(query.query_text, k=query.num_results)
-    
-    # Process results
-    search_results = []
-    result_urls = []
+    results = memory.search(
+        query.query_text,
+        k=query.num_results,
+        min_score=query.min_score,
+        hybrid=query.hybrid,
+        filters=query.filters
+    )
     
-    for metadata, score in results:
-        search_results.append(
-            SearchResult(
-                url=metadata.url,
-                content=metadata.chunk,
-                similarity_score=score
-            )
-        )
-        result_urls.append(metadata.url)
-        logger.debug(f"Added result from {metadata.url} with score {score:.4f}")
+    response = _build_response(query, results, memory)
     
     # Add to search history
     memory.add_to_history(
         query=query.query_text,
-        num_results=len(search_results),
-        result_urls=result_urls
+        num_results=len(response.results),
+        result_urls=[result.url for result in response.results]
     )
     
-    logger.info(f"Search completed with {len(search_results)} results")
-    return SearchResponse(
-        results=search_results,
-        query=query,
-        total_chunks_searched=len(memory.metadata)
+    logger.debug("Search completed with %d results", len(response.results))
+    return response
+
+def execute_search_batch(
+    queries: List[SearchQuery],
+    memory: MemoryManager,
+    record_history: bool = False
+) -> List[SearchResponse]:
+    """Execute many searches with one batched lookup; history is opt-in."""
+    logger.debug("Executing batch search for %d queries", len(queries))
+    
+    batch_results = memory.search_batch(
+        [query.query_text for query in queries],
+        ks=[query.num_results for query in queries],
+        min_scores=[query.min_score for query in queries],
+        hybrids=[query.hybrid for query in queries],
+        filters_per_query=[query.filters for query in queries]
     )
+    
+    responses = []
+    for query, results in zip(queries, batch_results):
+        response = _build_response(query, results, memory)
+        if record_history:
+            memory.add_to_history(
+                query=query.query_text,
+                num_results=len(response.results),
+                result_urls=[result.url for result in response.results]
+            )
+        responses.append(response)
+    
+    logger.debug("Batch search completed for %d queries", len(responses))
+    return responses
+
+def _build_response(query: SearchQuery, results, memory: MemoryManager) -> SearchResponse:
+    """Format raw (metadata, score) results as a SearchResponse."""
+    with stage("results"):
+        search_results = []
+        
+        for metadata, score in results:
+            search_results.append(
+                SearchResult(
+                    url=metadata.url,
+                    content=metadata.chunk,
+                    similarity_score=score
+                )
+            )
+            logger.debug("Added result from %s with score %.4f", metadata.url, score)
+        
+        return SearchResponse(
+            results=search_results,
+            query=query,
+            total_chunks_searched=len(memory.metadata)
+        )
 
 def show_search_history(memory: MemoryManager, limit: int = 5) -> List[dict]:
     """Show recent search history."""
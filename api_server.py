@@ -1,14 +1,30 @@
-from flask import Flask, request, jsonify
+import os
+import hmac
+import math
+import time
+import signal
+import atexit
+from typing import Optional
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from memory import MemoryManager
+from embedding_backends import get_backend
 from perception import extract_perception
 from decision import generate_search_plan
-from action import execute_search
+from action import execute_search, execute_search_batch
+from models import SearchFilters, SearchQuery, SearchResponse
 from logger_config import setup_logger
-from models import ChunkMetadata
-import json
-import numpy as np
-import faiss
+from store_reloader import StoreReloader
+from result_cache import SearchResultCache
+import metrics
+from embedding_store import (
+    DEFAULT_STORE_DIR,
+    LEGACY_EMBEDDINGS_FILE,
+    EmbeddingStore,
+    convert_json_store,
+    load_store,
+    store_exists
+)
 
 # Set up logger
 logger = setup_logger("api_server")
@@ -16,30 +32,195 @@ logger = setup_logger("api_server")
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Embedding backend; must match the one the store was built with
+EMBEDDING_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_MODEL = os.environ.get("RAG_EMBEDDING_MODEL")
+# ONNX backend: intra-op threads per inference (0 lets ONNX Runtime pick) and
+# whether to run the int8 graph
+ONNX_THREADS = int(os.environ.get("RAG_ONNX_THREADS", "0"))
+ONNX_QUANTIZED = os.environ.get("RAG_ONNX_QUANTIZED", "1") == "1"
+
+# Query embedding cache settings
+QUERY_CACHE_SIZE = int(os.environ.get("RAG_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_POLICY = os.environ.get("RAG_QUERY_CACHE_POLICY", "lru")
+QUERY_CACHE_PATH = os.environ.get("RAG_QUERY_CACHE_PATH", "query_cache.db") or None
+
+# Cache of finished /search responses, dropped when the store generation changes
+RESULT_CACHE_SIZE = int(os.environ.get("RAG_RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_MB = float(os.environ.get("RAG_RESULT_CACHE_MB", "16"))
+RESULT_CACHE_TTL = float(os.environ.get("RAG_RESULT_CACHE_TTL", "300"))
+
+# Search-time tuning of approximate indexes (IVF nprobe, HNSW efSearch)
+INDEX_NPROBE = os.environ.get("RAG_INDEX_NPROBE")
+INDEX_EF_SEARCH = os.environ.get("RAG_INDEX_EF_SEARCH")
+# Re-rank k * factor candidates of approximate indexes exactly; overrides the store's setting
+RERANK_FACTOR = os.environ.get("RAG_RERANK_FACTOR")
+
+# Default cosine similarity cutoff for /search (cosine stores only)
+DEFAULT_MIN_SCORE = os.environ.get("RAG_MIN_SCORE")
+
+# Fuse BM25 keyword and vector rankings by default; a "hybrid" field overrides it
+HYBRID_SEARCH = os.environ.get("RAG_HYBRID_SEARCH", "0") == "1"
+# Hybrid searches whose terms all occur in at most this fraction of chunks
+# search only those chunks
+PREFILTER_FRACTION = float(os.environ.get("RAG_PREFILTER_FRACTION", "0.01"))
+
+# Opt-in micro-batching of concurrent /search requests
+COALESCE_WINDOW_MS = os.environ.get("RAG_COALESCE_WINDOW_MS")
+COALESCE_MAX_BATCH = int(os.environ.get("RAG_COALESCE_MAX_BATCH", "32"))
+
+# Upper bound on queries accepted by /search/batch
+MAX_BATCH_QUERIES = int(os.environ.get("RAG_MAX_BATCH_QUERIES", "1000"))
+# Results per query are clamped to 1..MAX_K on /search and /search/batch
+MAX_K = int(os.environ.get("RAG_MAX_K", "100"))
+
+# Load the embedding model on a background thread at startup instead of on the first query
+WARMUP = os.environ.get("RAG_WARMUP", "1") == "1"
+
+# Per-stage latency histograms on /metrics; the hooks are no-ops when off
+METRICS_ENABLED = os.environ.get("RAG_METRICS", "0") == "1"
+metrics.registry.enabled = METRICS_ENABLED
+
+# Seconds between checks for a rebuilt store; 0 disables the watcher
+RELOAD_INTERVAL = float(os.environ.get("RAG_RELOAD_INTERVAL", "5"))
+# Required in X-Admin-Token for POST /admin/reload; unset disables admin endpoints
+ADMIN_TOKEN = os.environ.get("RAG_ADMIN_TOKEN")
+
 # Initialize memory manager
 memory = None
+reloader = None
+result_cache = None
+# In multi-worker mode the parent reloads the store; workers signal it
+reload_parent: Optional[int] = None
+
+def load_shared_store() -> EmbeddingStore:
+    """Load the embedding store, converting a legacy embeddings.json if needed."""
+    if not store_exists(DEFAULT_STORE_DIR):
+        logger.warning(f"Converting legacy {LEGACY_EMBEDDINGS_FILE} to {DEFAULT_STORE_DIR}")
+        convert_json_store(LEGACY_EMBEDDINGS_FILE, DEFAULT_STORE_DIR)
+    return load_store(DEFAULT_STORE_DIR)
+
+def backend_options() -> dict:
+    """Backend-specific settings from the environment."""
+    if EMBEDDING_BACKEND == "onnx":
+        return {"intra_op_threads": ONNX_THREADS, "quantized": ONNX_QUANTIZED}
+    return {}
 
-def initialize_memory():
-    """Initialize the memory manager with pre-computed embeddings."""
-    global memory
+def initialize_memory(store: Optional[EmbeddingStore] = None, parent: Optional[int] = None):
+    """
+    Initialize the memory manager with pre-computed embeddings.
+    
+    Args:
+        store: An already loaded store to share (e.g. inherited from a
+            parent process); loaded from disk when omitted
+        parent: pid of a serve.py parent that reloads the store for all
+            workers; no reloader runs in this process when given
+    """
+    global memory, reloader, result_cache, reload_parent
     try:
-        memory = MemoryManager()
-        # Load embeddings from file
-        with open("embeddings.json", "r") as f:
-            data = json.load(f)
-            memory.embeddings = [np.array(emb) for emb in data["embeddings"]]
-            memory.metadata = [ChunkMetadata(**meta) for meta in data["metadata"]]
-            
-            # Initialize FAISS index
-            if memory.embeddings:
-                memory.index = faiss.IndexFlatL2(len(memory.embeddings[0]))
-                memory.index.add(np.stack(memory.embeddings))
+        if store is None:
+            store = load_shared_store()
+        
+        memory = MemoryManager(
+            backend=get_backend(EMBEDDING_BACKEND, model=EMBEDDING_MODEL, **backend_options()),
+            query_cache_size=QUERY_CACHE_SIZE,
+            query_cache_policy=QUERY_CACHE_POLICY,
+            query_cache_path=QUERY_CACHE_PATH,
+            prefilter_fraction=PREFILTER_FRACTION
+        )
+        atexit.register(shutdown)
+        # Attach the memory-mapped embedding store
+        memory.attach_store(store)
+        memory.set_search_params(
+            nprobe=int(INDEX_NPROBE) if INDEX_NPROBE else None,
+            ef_search=int(INDEX_EF_SEARCH) if INDEX_EF_SEARCH else None,
+            rerank_factor=int(RERANK_FACTOR) if RERANK_FACTOR else None
+        )
+        if COALESCE_WINDOW_MS:
+            memory.enable_coalescing(
+                window_ms=float(COALESCE_WINDOW_MS),
+                max_batch_size=COALESCE_MAX_BATCH
+            )
+        if WARMUP:
+            memory.warm_up()
+        if RESULT_CACHE_SIZE > 0:
+            result_cache = SearchResultCache(
+                max_entries=RESULT_CACHE_SIZE,
+                max_bytes=int(RESULT_CACHE_MB * 2**20),
+                ttl_seconds=RESULT_CACHE_TTL
+            )
+        register_metrics(memory)
+        reload_parent = parent
+        if parent is None:
+            reloader = StoreReloader(memory, DEFAULT_STORE_DIR, poll_interval=RELOAD_INTERVAL)
+            if RELOAD_INTERVAL > 0:
+                reloader.start()
         
         logger.info(f"Successfully loaded {len(memory.metadata)} chunks")
     except Exception as e:
         logger.error(f"Error initializing memory: {str(e)}")
         raise
 
+def shutdown():
+    """
+    Stop the store watcher and flush the search history and query cache.
+
+    Registered with atexit; serve.py workers, which leave through os._exit,
+    call it themselves.
+    """
+    if reloader is not None:
+        reloader.stop()
+    if memory is not None:
+        memory.close()
+
+def register_metrics(memory: MemoryManager):
+    """Expose index size and cache counters of the memory manager on /metrics."""
+    registry = metrics.registry
+    registry.register(
+        "rag_index_vectors", "gauge", "Vectors in the index being served",
+        lambda: memory.index.ntotal if memory.index is not None else None
+    )
+    registry.register(
+        "rag_metadata_bytes", "gauge", "Memory used by the chunk metadata columns",
+        lambda: memory.metadata.nbytes
+    )
+    if memory.query_cache is not None:
+        cache = memory.query_cache
+        registry.register("rag_query_cache_hits_total", "counter", "Query embeddings served from memory",
+                          lambda: cache.stats()["hits"])
+        registry.register("rag_query_cache_disk_hits_total", "counter", "Query embeddings served from the spill file",
+                          lambda: cache.stats()["disk_hits"])
+        registry.register("rag_query_cache_misses_total", "counter", "Query embeddings that had to be computed",
+                          lambda: cache.stats()["misses"])
+        registry.register("rag_query_cache_hit_ratio", "gauge", "Fraction of query embedding lookups that hit",
+                          lambda: cache.stats()["hit_rate"])
+    if result_cache is not None:
+        registry.register("rag_result_cache_hits_total", "counter", "Searches answered from the result cache",
+                          lambda: result_cache.stats()["hits"])
+        registry.register("rag_result_cache_misses_total", "counter", "Searches not found in the result cache",
+                          lambda: result_cache.stats()["misses"])
+        registry.register("rag_result_cache_bytes", "gauge", "Memory held by cached search results",
+                          lambda: result_cache.nbytes)
+    if memory.coalescer is not None:
+        coalescer = memory.coalescer
+        registry.register("rag_coalescer_requests_total", "counter", "Searches routed through the coalescer",
+                          lambda: coalescer.stats()["requests"])
+        registry.register("rag_coalescer_batches_total", "counter", "Coalesced search batches dispatched",
+                          lambda: coalescer.stats()["batches"])
+        registry.register("rag_coalescer_mean_batch_size", "gauge", "Mean searches per coalesced batch",
+                          lambda: coalescer.stats()["mean_batch_size"])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Label by route template so unknown paths do not add series
+    if request.url_rule is not None and 'request_start' in g:
+        metrics.registry.observe_request(request.url_rule.rule, time.perf_counter() - g.request_start)
+    return response
+
 @app.route('/search', methods=['POST'])
 def search():
     """Handle search requests from the extension."""
@@ -47,40 +228,272 @@ def search():
         data = request.get_json()
         query = data.get('query')
         
-        if not query:
+        if not isinstance(query, str) or not query.strip():
             return jsonify({"error": "No query provided"}), 400
         
-        logger.info(f"Received search request: {query}")
+        logger.info("Received search request: %s", query)
+        
+        try:
+            min_score = parse_min_score(data)
+            hybrid = parse_flag(data, 'hybrid', HYBRID_SEARCH)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid filters: {e}"}), 400
+        
+        generation = memory.generation
+        cache_key = None
+        if result_cache is not None:
+            # Keyed on the request, so a hit also skips perception and decision
+            cache_key = result_cache.make_key(query, min_score, hybrid, filters)
+            cached = result_cache.get(cache_key, generation)
+            if cached is not None:
+                body, query_text, result_urls = cached
+                memory.add_to_history(
+                    query=query_text,
+                    num_results=len(result_urls),
+                    result_urls=result_urls
+                )
+                logger.info("Returning %d cached results", len(result_urls))
+                return Response(body, mimetype="application/json")
         
         # Extract intent
-        intent = extract_perception(query)
+        with metrics.stage("perception"):
+            intent = extract_perception(query)
         
         # Generate search plan
-        search_query, show_history = generate_search_plan(intent, memory)
+        with metrics.stage("decision"):
+            search_query, show_history = generate_search_plan(intent, memory)
         
         if show_history:
             return jsonify({"error": "History requests not supported in extension"}), 400
         
+        search_query.min_score = min_score
+        search_query.hybrid = hybrid
+        search_query.filters = filters
+        search_query.num_results = parse_k(search_query.num_results)
+        
         # Execute search
         response = execute_search(search_query, memory)
         
         # Format results for the extension
-        results = [
-            {
-                "url": result.url,
-                "content": result.content,
-                "similarity_score": result.similarity_score
-            }
-            for result in response.results
-        ]
-        
-        logger.info(f"Returning {len(results)} results")
-        return jsonify({"results": results})
+        results = format_results(response)
+        
+        logger.info("Returning %d results", len(results))
+        reply = jsonify({"results": results})
+        if cache_key is not None:
+            # Cache the serialized body; a hit skips embedding, search and serialization
+            body = reply.get_data()
+            result_urls = [result["url"] for result in results]
+            result_cache.put(
+                cache_key,
+                generation,
+                (body, search_query.query_text, result_urls),
+                size=len(body) + sum(len(url) for url in result_urls)
+            )
+        return reply
     
     except Exception as e:
         logger.error(f"Error processing search request: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Handle many queries in one request.
+    
+    Body: {"queries": [...], "k": 3, "min_score": null, "hybrid": false,
+    "filters": null, "record_history": false}.
+    Queries are not checked for history intent; every query is searched.
+    """
+    try:
+        data = request.get_json()
+        queries = data.get('queries')
+        
+        if not queries or not isinstance(queries, list):
+            return jsonify({"error": "No queries provided"}), 400
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+        for i, query in enumerate(queries):
+            if not isinstance(query, str) or not query.strip():
+                return jsonify({"error": f"Query {i} must be a non-empty string"}), 400
+        
+        logger.info("Received batch search request with %d queries", len(queries))
+        
+        try:
+            k = parse_k(data['k']) if data.get('k') is not None else None
+            min_score = parse_min_score(data)
+            hybrid = parse_flag(data, 'hybrid', HYBRID_SEARCH)
+            record_history = parse_flag(data, 'record_history', False)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid filters: {e}"}), 400
+        search_queries = []
+        for query in queries:
+            with metrics.stage("perception"):
+                intent = extract_perception(query)
+            search_queries.append(SearchQuery(
+                query_text=intent.query,
+                num_results=k if k is not None else parse_k(intent.num_results),
+                min_score=min_score,
+                hybrid=hybrid,
+                filters=filters
+            ))
+        
+        responses = execute_search_batch(
+            search_queries,
+            memory,
+            record_history=record_history
+        )
+        
+        return jsonify({
+            "results": [
+                {"query": query, "results": format_results(response)}
+                for query, response in zip(queries, responses)
+            ]
+        })
+    
+    except Exception as e:
+        logger.error(f"Error processing batch search request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Swap in the store on disk if it is a new generation."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled; set RAG_ADMIN_TOKEN"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+    if reloader is None:
+        # The parent loads the new store once and replaces the workers
+        os.kill(reload_parent, signal.SIGHUP)
+        return jsonify({"reload_requested": True, "generation": memory.generation}), 202
+    try:
+        reloaded = reloader.reload()
+        return jsonify({
+            "reloaded": reloaded,
+            "generation": memory.generation,
+            "chunks": len(memory.metadata)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e), "generation": memory.generation}), 500
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness check; answers while the embedding model is still loading."""
+    if memory is None:
+        return jsonify({"status": "unavailable"}), 503
+    return jsonify({
+        "status": "ok",
+        "chunks": len(memory.metadata),
+        "model_loaded": memory.backend.loaded
+    })
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report cache, request coalescing and store reload statistics."""
+    data = {"chunks": len(memory.metadata) if memory else 0}
+    if reloader is not None:
+        data["store"] = reloader.stats()
+    if memory and memory.query_cache is not None:
+        data["query_cache"] = memory.query_cache.stats()
+    if memory and memory.coalescer is not None:
+        data["coalescer"] = memory.coalescer.stats()
+    if result_cache is not None:
+        data["result_cache"] = result_cache.stats()
+    return jsonify(data)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage and request latency histograms, index size and cache counters in Prometheus format."""
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled; set RAG_METRICS=1"}), 404
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+def parse_min_score(data: dict) -> Optional[float]:
+    """Read the optional "min_score" of a search request, defaulting to RAG_MIN_SCORE."""
+    min_score = data.get('min_score', DEFAULT_MIN_SCORE)
+    if min_score is None:
+        return None
+    try:
+        if isinstance(min_score, bool):
+            raise TypeError
+        value = float(min_score)
+    except (TypeError, ValueError):
+        raise ValueError(f'"min_score" must be a number, got {min_score!r}') from None
+    if not math.isfinite(value):
+        raise ValueError('"min_score" must be finite')
+    return value
+
+def parse_k(k) -> int:
+    """Clamp a requested result count to 1..MAX_K."""
+    if isinstance(k, bool) or not isinstance(k, int):
+        raise ValueError(f'"k" must be an integer, got {k!r}')
+    return max(1, min(k, MAX_K))
+
+def parse_flag(data: dict, field: str, default: bool) -> bool:
+    """Read an optional boolean field; only JSON true and false are accepted."""
+    value = data.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, bool):
+        raise ValueError(f'"{field}" must be true or false, got {value!r}')
+    return value
+
+FILTER_FIELDS = {'domains', 'url_prefix', 'visited_after', 'visited_before', 'visited_within_days'}
+
+def parse_filters(data: dict) -> Optional[SearchFilters]:
+    """
+    Read the optional "filters" object of a search request.
+    
+    {"domains": ["github.com"], "url_prefix": "https://docs.python.org/3/",
+    "visited_after": "2024-05-01T00:00:00", "visited_before": null,
+    "visited_within_days": 7}; a single domain may be given as a string.
+    Raises ValueError, which includes pydantic's ValidationError, when the
+    value is not an object or a field has the wrong type.
+    """
+    filters = data.get('filters')
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError('"filters" must be an object')
+    if not filters:
+        return None
+    unknown = sorted(set(filters) - FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(unknown)}")
+
+    domains = filters.get('domains')
+    if isinstance(domains, str):
+        filters = {**filters, 'domains': [domains]}
+    elif domains is not None and not (
+        isinstance(domains, list) and all(isinstance(domain, str) for domain in domains)
+    ):
+        raise ValueError('"domains" must be a string or a list of strings')
+    for field in ('url_prefix', 'visited_after', 'visited_before'):
+        if not isinstance(filters.get(field), (str, type(None))):
+            raise ValueError(f'"{field}" must be a string')
+    within_days = filters.get('visited_within_days')
+    if within_days is not None and (isinstance(within_days, bool) or not isinstance(within_days, (int, float))):
+        raise ValueError('"visited_within_days" must be a number')
+    return SearchFilters(**filters)
+
+def format_results(response: SearchResponse) -> list:
+    """Format a SearchResponse for the extension."""
+    return [
+        {
+            "url": result.url,
+            "content": result.content,
+            "similarity_score": result.similarity_score
+        }
+        for result in response.results
+    ]
+
 if __name__ == '__main__':
     try:
         initialize_memory()
@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for ingestion, index loading, search latency, memory and recall.
+
+Run from the repository root:
+
+    python -m benchmarks.run --sizes 100 1000 --output results.json
+"""
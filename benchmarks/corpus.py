@@ -0,0 +1,88 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+
+# Shape of the synthetic corpus
+VOCAB_SIZE = 5000
+NUM_TOPICS = 50
+TOPIC_WORDS = 200
+TOPIC_SHARE = 0.7          # Fraction of a page's words drawn from its topic
+MEAN_PAGE_WORDS = 600
+PAGES_PER_SITE = 20
+FOOTER_WORDS = 60          # Site boilerplate repeated on every page of a site
+WORDS_PER_LINE = 20
+FIRST_VISIT = datetime(2024, 1, 1)
+
+_SYLLABLES = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+
+class SyntheticCorpus:
+    """
+    Generator of scraped pages and queries with topical structure.
+
+    Pages mix words of one topic with common words, so topic queries have
+    meaningful nearest neighbours. Pages of a site share a footer, which
+    gives the deduplicator work like real browsing history does. The same
+    seed always produces the same corpus.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        words = set()
+        while len(words) < VOCAB_SIZE:
+            length = self.rng.integers(2, 5)
+            words.add("".join(self.rng.choice(_SYLLABLES, size=length)))
+        self.vocab = np.array(sorted(words))
+        # Zipf-like frequencies for common words
+        weights = 1.0 / np.arange(1, VOCAB_SIZE + 1)
+        self.common_weights = weights / weights.sum()
+        self.topics = [
+            self.rng.choice(VOCAB_SIZE, size=TOPIC_WORDS, replace=False)
+            for _ in range(NUM_TOPICS)
+        ]
+        topic_weights = 1.0 / np.arange(1, TOPIC_WORDS + 1)
+        self.topic_weights = topic_weights / topic_weights.sum()
+
+    def _words(self, topic: int, count: int) -> List[str]:
+        from_topic = self.rng.random(count) < TOPIC_SHARE
+        ids = self.rng.choice(VOCAB_SIZE, size=count, p=self.common_weights)
+        topic_ids = self.topics[topic][
+            self.rng.choice(TOPIC_WORDS, size=count, p=self.topic_weights)
+        ]
+        ids[from_topic] = topic_ids[from_topic]
+        return self.vocab[ids].tolist()
+
+    def write_pages(self, directory: str, num_pages: int) -> int:
+        """Write num_pages scraped pages into directory; returns the words written."""
+        os.makedirs(directory, exist_ok=True)
+        num_sites = max(1, num_pages // PAGES_PER_SITE)
+        footers = [self._words(site % NUM_TOPICS, FOOTER_WORDS) for site in range(num_sites)]
+        total_words = 0
+        for page in range(num_pages):
+            site = int(self.rng.integers(num_sites))
+            topic = int(self.rng.integers(NUM_TOPICS))
+            count = max(20, int(self.rng.lognormal(np.log(MEAN_PAGE_WORDS), 0.5)))
+            words = self._words(topic, count) + footers[site]
+            visited = FIRST_VISIT + timedelta(seconds=int(self.rng.integers(365 * 86400)))
+            lines = [
+                " ".join(words[i:i + WORDS_PER_LINE])
+                for i in range(0, len(words), WORDS_PER_LINE)
+            ]
+            with open(os.path.join(directory, f"page{page:07d}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"URL: https://site{site}.example.com/topic{topic}/page{page}\n")
+                f.write(f"Title: {' '.join(words[:5])}\n")
+                f.write(f"Visited: {visited.isoformat()}\n\n")
+                f.write("\n".join(lines))
+                f.write("\n")
+            total_words += len(words)
+        return total_words
+
+    def queries(self, count: int) -> List[str]:
+        """Short queries made of frequent words of a random topic."""
+        queries = []
+        for _ in range(count):
+            topic = self.topics[int(self.rng.integers(NUM_TOPICS))]
+            length = int(self.rng.integers(2, 6))
+            ids = topic[self.rng.choice(TOPIC_WORDS // 4, size=length, replace=False)]
+            queries.append(" ".join(self.vocab[ids]))
+        return queries
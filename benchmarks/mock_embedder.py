@@ -0,0 +1,46 @@
+import hashlib
+from typing import Dict, List
+import numpy as np
+from embedding_backends import EmbeddingBackend
+
+TABLE_SIZE = 4096  # Random token vectors; tokens are hashed into this table
+
+class MockEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic bag-of-words embedder for benchmarks.
+
+    Each token is hashed to a fixed random vector and a text embeds to the
+    normalized sum of its tokens, so texts sharing words are close and
+    results are identical across runs and processes. It needs no model or
+    network.
+    """
+
+    name = "mock-bag-of-words"
+    max_batch_size = 256
+
+    def __init__(self, dimension: int = 384, seed: int = 0):
+        self._dimension = dimension
+        self.table = np.random.default_rng(seed).standard_normal(
+            (TABLE_SIZE, dimension)
+        ).astype(np.float32)
+        self._rows: Dict[str, int] = {}
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _row(self, token: str) -> int:
+        row = self._rows.get(token)
+        if row is None:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            row = self._rows[token] = int.from_bytes(digest, "little") % TABLE_SIZE
+        return row
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            rows = [self._row(token) for token in text.lower().split()]
+            if rows:
+                embeddings[i] = self.table[rows].sum(axis=0)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+import faiss
+from memory import MemoryManager
+from create_embedding import create_embeddings
+from embedding_store import DEFAULT_STORE_DIR
+from file_manifest import load_manifest
+from dedup import DEDUP_MODES
+from index_factory import INDEX_TYPES, METRICS, QUANTIZATIONS, IndexConfig, build_index, normalize_vectors
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.mock_embedder import MockEmbeddingBackend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, if the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def latency_summary(seconds: List[float]) -> dict:
+    millis = np.array(seconds) * 1000
+    return {
+        "mean": float(millis.mean()),
+        "p50": float(np.percentile(millis, 50)),
+        "p95": float(np.percentile(millis, 95)),
+        "p99": float(np.percentile(millis, 99)),
+    }
+
+def _quiet_logs():
+    """Silence per-file INFO logging; benchmarks report through the results."""
+    for name in list(logging.Logger.manager.loggerDict):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+def _timed_searches(memory: MemoryManager, queries: List[str], k: int, hybrid: bool = False) -> List[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        memory.search(query, k=k, hybrid=hybrid)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def _recall(memory: MemoryManager, queries: List[str], k: int) -> float:
+    """recall@k of MemoryManager.search against an exact flat search of the same vectors."""
+    vectors = np.ascontiguousarray(memory.vectors(), dtype=np.float32)
+    exact = build_index(vectors, IndexConfig(metric=memory.index_config.metric))
+    query_vecs = memory.backend.embed_many(queries)
+    if memory.cosine:
+        query_vecs = normalize_vectors(query_vecs)
+    _, truth = exact.search(query_vecs, k)
+
+    hits = total = 0
+    for query, expected in zip(queries, truth):
+        ids = [meta.chunk_id for meta, _ in memory.search(query, k=k)]
+        rows = set(memory.metadata.find(ids).values())
+        expected = {int(row) for row in expected if row >= 0}
+        hits += len(rows & expected)
+        total += len(expected)
+    return hits / total if total else 1.0
+
+def run_size(num_pages: int, args: argparse.Namespace) -> dict:
+    """Build a corpus of num_pages pages in a scratch directory and measure it."""
+    if not args.verbose:
+        _quiet_logs()
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    cwd = os.getcwd()
+    try:
+        # create_embeddings reads scraped_texts/ and writes the store relative to cwd
+        os.chdir(workdir)
+        corpus = SyntheticCorpus(seed=args.seed)
+        words = corpus.write_pages("scraped_texts", num_pages)
+        backend = MockEmbeddingBackend(dimension=args.dimension, seed=args.seed)
+        index_config = IndexConfig(
+            index_type=args.index_type,
+            metric=args.metric,
+            nlist=args.nlist,
+            quantization=args.quantization,
+            rerank_factor=args.rerank_factor
+        )
+
+        start = time.perf_counter()
+        create_embeddings(
+            batch_size=args.batch_size,
+            incremental=False,
+            index_config=index_config,
+            backend=backend,
+            dedup=args.dedup
+        )
+        ingest_seconds = time.perf_counter() - start
+        chunks = sum(entry.get("chunks", 0) for entry in load_manifest(DEFAULT_STORE_DIR).values())
+
+        memory = MemoryManager(
+            backend=backend,
+            query_cache_size=0,
+            history_file=os.path.join(workdir, "search_history.jsonl")
+        )
+        start = time.perf_counter()
+        memory.load_store(DEFAULT_STORE_DIR)
+        load_seconds = time.perf_counter() - start
+
+        queries = corpus.queries(args.queries)
+        # Warm up lazily built structures (keyword index, page cache)
+        _timed_searches(memory, queries[:10], args.k, hybrid=True)
+        vector_latencies = _timed_searches(memory, queries, args.k)
+        hybrid_latencies = _timed_searches(memory, queries, args.k, hybrid=True)
+
+        result = {
+            "pages": num_pages,
+            "words": words,
+            "chunks": chunks,
+            "vectors": len(memory.metadata),
+            "ingest_seconds": ingest_seconds,
+            "chunks_per_sec": chunks / ingest_seconds if ingest_seconds > 0 else None,
+            "load_seconds": load_seconds,
+            "search_latency_ms": latency_summary(vector_latencies),
+            "hybrid_search_latency_ms": latency_summary(hybrid_latencies),
+            "recall_at_k": _recall(memory, queries, args.k),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        memory.history.close()
+        return result
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Kept benchmark corpus in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    """Measure every corpus size, each in a fresh process so peak RSS is per size."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for num_pages in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_size, num_pages, args).result()
+        results.append(result)
+        print(
+            f"{num_pages:>8} pages  {result['chunks']:>9} chunks  "
+            f"{result['chunks_per_sec']:>9.0f} chunks/s  load {result['load_seconds']:.2f}s  "
+            f"p50 {result['search_latency_ms']['p50']:.2f}ms  "
+            f"p99 {result['search_latency_ms']['p99']:.2f}ms  "
+            f"recall@{args.k} {result['recall_at_k']:.3f}  "
+            f"peak {result['peak_rss_mb'] or 0:.0f} MB",
+            file=sys.stderr
+        )
+    return {
+        "benchmark": "rag",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "faiss": getattr(faiss, "__version__", None),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "verbose", "keep")},
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingestion, load time, search latency, memory and recall on synthetic corpora"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000],
+                        help="Corpus sizes in pages")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per size")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimension", type=int, default=384, help="Mock embedding dimension")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks encoded per call")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--metric", choices=METRICS, default="cosine")
+    parser.add_argument("--nlist", type=int, default=IndexConfig().nlist)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    parser.add_argument("--rerank-factor", type=int, default=0)
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="near")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated corpora and stores")
+    parser.add_argument("--verbose", action="store_true", help="Show ingestion logs")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,91 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# Default chunking: words per chunk and words shared by consecutive chunks
+CHUNK_SIZE = 50
+CHUNK_OVERLAP = 10
+
+# Characters read per block when streaming a page body
+READ_BLOCK_SIZE = 64 * 1024
+
+def read_headers(f: TextIO) -> Tuple[Dict[str, str], bool]:
+    """
+    Read the "Key: value" header lines of a scraped page up to the first blank line.
+
+    Returns the header fields (first value wins) and whether a body
+    follows. The file is left positioned at the start of the body.
+    """
+    headers = {}
+    for line in iter(f.readline, ""):
+        if line == "\n":
+            return headers, True
+        key, sep, value = line.partition(": ")
+        if sep and key not in headers:
+            headers[key] = value.strip()
+    return headers, False
+
+def read_header(f: TextIO) -> Tuple[Optional[str], bool]:
+    """Read the header of a scraped page; returns its URL (or None) and whether a body follows."""
+    headers, has_body = read_headers(f)
+    return headers.get("URL") or None, has_body
+
+def visit_time(headers: Dict[str, str], path) -> int:
+    """
+    Unix time a page was visited: its "Visited: " header (ISO 8601) if
+    present, else the modification time of the scraped file.
+    """
+    visited = headers.get("Visited")
+    if visited:
+        try:
+            return int(datetime.fromisoformat(visited).timestamp())
+        except ValueError:
+            pass
+    return int(os.path.getmtime(path))
+
+def iter_words(f: TextIO, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """Yield whitespace-separated words from a file, reading it in blocks."""
+    partial = ""
+    for block in iter(lambda: f.read(block_size), ""):
+        words = (partial + block).split()
+        # A block that does not end in whitespace may end mid-word
+        partial = words.pop() if words and not block[-1].isspace() else ""
+        yield from words
+    if partial:
+        yield partial
+
+def iter_chunks(words: Iterable[str], size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Yield overlapping chunks of size words, starting every size - overlap words.
+
+    Only the current chunk is buffered, so memory does not grow with the
+    number of words.
+    """
+    step = size - overlap
+    buffer: List[str] = []
+    for word in words:
+        buffer.append(word)
+        if len(buffer) == size:
+            yield " ".join(buffer)
+            del buffer[:step]
+    # Tail chunks start before the end of the text, like the full chunks
+    while buffer:
+        yield " ".join(buffer[:size])
+        del buffer[:step]
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list:
+    """Split text into overlapping chunks."""
+    return list(iter_chunks(text.split(), size, overlap))
+
+@contextmanager
+def open_page(path, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+    """
+    Open a scraped page and stream its chunks.
+
+    Yields (url, chunks) where chunks is a generator over the body, or None
+    if the page has no body. The generator is only valid inside the with block.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        url, has_body = read_header(f)
+        yield url, iter_chunks(iter_words(f), size, overlap) if has_body else None
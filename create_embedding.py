@@ -1,97 +1,254 @@
 import os
+import time
+import argparse
 from pathlib import Path
+from typing import Optional
 from memory import MemoryManager
 from models import ChunkMetadata
-import json
+from embedding_backends import BACKENDS, EmbeddingBackend, get_backend
+from index_factory import INDEX_TYPES, METRICS, QUANTIZATIONS, IndexConfig
+from embedding_store import DEFAULT_STORE_DIR, store_exists, stored_index_config
+from metadata_table import MetadataTable
+from chunking import iter_chunks, iter_words, read_headers, visit_time
+from dedup import DEDUP_MODES, ChunkDeduplicator, chunk_ref, load_signatures
+from file_manifest import chunk_ids_for, diff_files, load_manifest, save_manifest
 from logger_config import setup_logger
 
 # Set up logger
 logger = setup_logger("create_embedding")
 
-def chunk_text(text: str, size: int = 50, overlap: int = 10) -> list:
-    """Split text into overlapping chunks."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i+size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
-
-def create_embeddings():
-    """Create embeddings for all scraped texts and save them."""
-    memory = MemoryManager()
+def create_embeddings(
+    batch_size: int = 64,
+    num_workers: int = 0,
+    incremental: bool = True,
+    index_config: Optional[IndexConfig] = None,
+    backend: Optional[EmbeddingBackend] = None,
+    dedup: str = "near",
+    near_threshold: float = 0.8
+):
+    """
+    Create embeddings for all scraped texts and save them.
+    
+    Args:
+        batch_size: Number of chunks encoded per model call
+        num_workers: Number of CPU encode processes (0 encodes in-process;
+            sentence-transformers only)
+        incremental: Only embed files that are new or changed since the last run
+        index_config: FAISS index type and parameters (defaults to the store's)
+        backend: Embedding backend (defaults to the local sentence-transformers model)
+        dedup: "near" and "exact" embed duplicate chunks once and store them
+            as references to the first copy; "off" embeds every chunk
+        near_threshold: Minimum estimated Jaccard similarity of near duplicates
+    """
+    store_dir = DEFAULT_STORE_DIR
+    if index_config is None:
+        # Keep the existing store's index, also when re-embedding everything
+        index_config = stored_index_config(store_dir)
+    memory = MemoryManager(backend=backend, index_config=index_config)
     scraped_texts_path = Path("scraped_texts")
-    embeddings_file = "embeddings.json"
     
     if not scraped_texts_path.exists():
         logger.error("scraped_texts directory not found!")
         return
     
-    logger.info("Starting to process scraped history files...")
+    manifest = {}
+    if incremental and store_exists(store_dir):
+        manifest = load_manifest(store_dir)
+    
+    files = sorted(scraped_texts_path.glob("*.txt"))
+    changed, unchanged, deleted = diff_files(manifest, files)
+    
+    if manifest:
+        # Append to the existing store after dropping stale chunks
+        store = memory.load_store(store_dir, mmap=False)
+        metric_changed = index_config is not None and index_config.metric != store.index_config.metric
+        if store.info.get("model_name") != memory.model_name or metric_changed:
+            logger.warning("Store was built with a different model or metric, re-embedding everything")
+            memory.metadata, memory.embeddings, memory.index = MetadataTable(), [], None
+            memory.index_config = index_config or store.index_config
+            manifest = {}
+            changed, unchanged, deleted = diff_files(manifest, files)
+        else:
+            if index_config is not None and index_config != store.index_config:
+                logger.info(f"Rebuilding index as {index_config.index_type}")
+                memory.rebuild_index(index_config)
+
+            stale_ids = []
+            for key in list(changed) + deleted:
+                if key in manifest:
+                    stale_ids.extend(chunk_ids_for(key, manifest.pop(key)))
+            memory.remove_chunks(stale_ids)
+            
+            if not changed and not deleted and memory.index is not None:
+                save_manifest(store_dir, manifest)
+                logger.info("Embeddings are up to date")
+                return
+    
+    deduplicator = ChunkDeduplicator(dedup, threshold=near_threshold)
+    if dedup != "off":
+        saved = load_signatures(store_dir) if manifest else {}
+        deduplicator.seed(zip(memory.metadata.chunk_ids(), memory.metadata.chunks()), saved)
+    
+    logger.info(f"Starting to process {len(changed)} scraped history files...")
     total_chunks = 0
+    if num_workers > 0:
+        memory.start_encode_pool(num_workers)
+    # Chunks are buffered across files and encoded once enough are pending
+    flush_size = batch_size * max(1, num_workers)
+    pending_chunks = []
+    pending_metadata = []
+    # (representative chunk id, reference) pairs, recorded once all chunks are added
+    duplicate_refs = []
+    start_time = time.perf_counter()
     
-    for file in scraped_texts_path.glob("*.txt"):
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-                # Extract URL
-                url = None
-                for line in content.split('\n'):
-                    if line.startswith('URL: '):
-                        url = line[5:].strip()
-                        break
-                
-                if not url:
-                    logger.warning(f"No URL found in file: {file.name}")
-                    continue
-                
-                # Get actual content
-                content_lines = content.split('\n\n', 1)
-                if len(content_lines) > 1:
-                    actual_content = content_lines[1]
+    def flush():
+        if not pending_chunks:
+            return
+        embeddings = memory.get_embeddings(pending_chunks, batch_size=batch_size)
+        memory.add_chunks(pending_metadata, embeddings)
+        pending_chunks.clear()
+        pending_metadata.clear()
+    
+    try:
+        for file in files:
+            key = str(file)
+            if key not in changed:
+                continue
+            file_chunks = 0
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    headers, has_body = read_headers(f)
+                    url = headers.get("URL")
+                    if not url:
+                        logger.warning(f"No URL found in file: {file.name}")
+                        manifest[key] = {**changed[key], "chunks": 0}
+                        continue
                     
-                    # Create chunks
-                    chunks = chunk_text(actual_content)
-                    file_chunks = 0
+                    if not has_body:
+                        manifest[key] = {**changed[key], "chunks": 0}
+                        logger.warning(f"No content found in file: {file.name}")
+                        continue
+                    visited_at = visit_time(headers, file)
                     
-                    # Process each chunk
-                    for idx, chunk in enumerate(chunks):
-                        metadata = ChunkMetadata(
+                    # Queue each chunk for batched encoding as it is read, so
+                    # large pages are never held in memory whole
+                    for chunk in iter_chunks(iter_words(f)):
+                        meta = ChunkMetadata(
                             url=url,
                             chunk=chunk,
-                            chunk_id=f"{file.stem}_{idx}"
+                            chunk_id=f"{file.stem}_{file_chunks}",
+                            visited_at=visited_at
                         )
-                        embedding = memory.get_embedding(chunk)
-                        memory.add_chunk(metadata, embedding)
                         file_chunks += 1
+                        representative = deduplicator.check(meta)
+                        if representative is not None:
+                            duplicate_refs.append((representative, chunk_ref(meta)))
+                            continue
+                        pending_chunks.append(chunk)
+                        pending_metadata.append(meta)
+                        if len(pending_chunks) >= flush_size:
+                            flush()
                     
                     total_chunks += file_chunks
+                    manifest[key] = {**changed[key], "chunks": file_chunks}
                     logger.info(f"Processed {file.name}: {file_chunks} chunks")
-                else:
-                    logger.warning(f"No content found in file: {file.name}")
+            
+            except Exception as e:
+                # Drop the file's partial chunks and leave it out of the
+                # manifest so the next run retries it
+                partial_ids = set(chunk_ids_for(key, {"chunks": file_chunks}))
+                kept = [(c, m) for c, m in zip(pending_chunks, pending_metadata)
+                        if m.chunk_id not in partial_ids]
+                pending_chunks[:] = [c for c, _ in kept]
+                pending_metadata[:] = [m for _, m in kept]
+                duplicate_refs[:] = [(rep, ref) for rep, ref in duplicate_refs
+                                     if ref.chunk_id not in partial_ids]
+                memory.remove_chunks(list(partial_ids))
+                deduplicator.discard(partial_ids)
+                manifest.pop(key, None)
+                logger.error(f"Error processing file {file.name}: {str(e)}")
         
-        except Exception as e:
-            logger.error(f"Error processing file {file.name}: {str(e)}")
+        flush()
+        memory.add_duplicates(duplicate_refs)
+    finally:
+        if num_workers > 0:
+            memory.stop_encode_pool()
+    
+    elapsed = time.perf_counter() - start_time
+    rate = total_chunks / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Embedded {total_chunks} chunks in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
+    if dedup != "off":
+        dimension = memory.dimension
+        stats = deduplicator.stats(dimension)
+        logger.info(
+            f"Deduplicated {stats['exact_duplicates']} exact and {stats['near_duplicates']} "
+            f"near-duplicate chunks of {stats['chunks']} ({stats['saved_ratio']:.1%} fewer encodes"
+            + (f", {stats['saved_bytes'] / 1e6:.1f} MB less vector storage)" if dimension else ")")
+        )
     
     try:
-        # Save embeddings and metadata
-        embeddings_data = {
-            "embeddings": [emb.tolist() for emb in memory.embeddings],
-            "metadata": [meta.dict() for meta in memory.metadata]
-        }
-        
-        with open(embeddings_file, 'w') as f:
-            json.dump(embeddings_data, f)
+        # Save embeddings, metadata and index as a binary store
+        memory.save_store(store_dir)
+        if dedup != "off":
+            deduplicator.save(store_dir, memory.metadata.chunk_ids())
+        save_manifest(store_dir, manifest)
         
         logger.info(f"Successfully created embeddings for {total_chunks} chunks")
-        logger.info(f"Embeddings saved to: {embeddings_file}")
+        logger.info(f"Embeddings saved to: {store_dir}")
     
     except Exception as e:
         logger.error(f"Error saving embeddings: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create embeddings for scraped history")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Chunks encoded per model call")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="CPU encode processes (0 encodes in-process)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="sentence-transformers",
+                        help="Embedding backend")
+    parser.add_argument("--model", help="Embedding model name for the backend")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-embed every file instead of only new or changed ones")
+    parser.add_argument("--index-type", choices=INDEX_TYPES,
+                        help="FAISS index type (defaults to the existing store's, else flat)")
+    parser.add_argument("--metric", choices=METRICS,
+                        help="l2 distance, or cosine similarity on normalized vectors")
+    parser.add_argument("--nlist", type=int,
+                        help=f"Inverted lists for IVF indexes (default {IndexConfig().nlist})")
+    parser.add_argument("--pq-m", type=int,
+                        help=f"Sub-quantizers for IVF-PQ (default {IndexConfig().pq_m})")
+    parser.add_argument("--hnsw-m", type=int,
+                        help=f"Graph degree for HNSW (default {IndexConfig().hnsw_m})")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS,
+                        help="Store index vectors as fp16 or int8 (flat, ivf_flat and hnsw)")
+    parser.add_argument("--rerank-factor", type=int,
+                        help="Re-rank k * factor approximate candidates exactly at search time")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="near",
+                        help="Embed exact or near-duplicate chunks once (default: near)")
+    parser.add_argument("--near-threshold", type=float, default=0.8,
+                        help="Minimum shingle Jaccard similarity of near duplicates")
+    args = parser.parse_args()
+    
+    # Flags that were given override the existing store's settings, not the defaults
+    overrides = {
+        field: getattr(args, field)
+        for field in ("index_type", "metric", "nlist", "pq_m", "hnsw_m", "quantization", "rerank_factor")
+        if getattr(args, field) is not None
+    }
+    index_config = None
+    if overrides:
+        base = stored_index_config(DEFAULT_STORE_DIR) or IndexConfig()
+        index_config = IndexConfig(**{**base.dict(), **overrides})
+    
     logger.info("Starting embedding creation process")
-    create_embeddings()
+    create_embeddings(
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        incremental=not args.full,
+        index_config=index_config,
+        backend=get_backend(args.backend, model=args.model),
+        dedup=args.dedup,
+        near_threshold=args.near_threshold
+    )
     logger.info("Embedding creation process completed") 
\ No newline at end of file
@@ -17,17 +17,17 @@ def generate_search_plan(
     - SearchQuery: The processed query with parameters
     - bool: Whether to show history instead of searching
     """
-    logger.info(f"Generating search plan for intent: {intent.dict()}")
+    logger.debug("Generating search plan for intent: %r", intent)
     
     if intent.is_history_request:
-        logger.info("Intent is history request, will show history")
+        logger.debug("Intent is history request, will show history")
         return None, True
     
     search_query = SearchQuery(
         query_text=intent.query,
         num_results=intent.num_results
     )
-    logger.info(f"Generated search query: {search_query.dict()}")
+    logger.debug("Generated search query: %r", search_query)
     return search_query, False
 
 def process_search_results(
@@ -35,7 +35,7 @@ def process_search_results(
     query: SearchQuery
 ) -> List[SearchResult]:
     """Process and format search results."""
-    logger.info(f"Processing {len(results)} search results")
+    logger.debug("Processing %d search results", len(results))
     search_results = []
     
     for metadata, score in results:
@@ -46,7 +46,7 @@ def process_search_results(
                 similarity_score=score
             )
         )
-        logger.debug(f"Processed result from {metadata.url} with score {score:.4f}")
+        logger.debug("Processed result from %s with score %.4f", metadata.url, score)
     
-    logger.info(f"Successfully processed {len(search_results)} results")
+    logger.debug("Successfully processed %d results", len(search_results))
     return search_results 
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from models import ChunkMetadata, ChunkRef
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("dedup")
+
+DEDUP_MODES = ["off", "exact", "near"]
+SHINGLE_SIZE = 3            # Words per shingle
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16          # Chunks sharing all rows of any band are compared
+MAX_BUCKET_CANDIDATES = 64  # Most recent chunks compared per band bucket
+SIGNATURES_FILE = "dedup.npz"  # Lives next to store.json in the store directory
+
+# Fixed seed: signatures must stay comparable between ingestion runs
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 2 ** 62, size=MINHASH_PERMUTATIONS, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 62, size=MINHASH_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+# chunk id -> (sha1 digest of the chunk, MinHash signature or None)
+Signatures = Dict[str, Tuple[bytes, Optional[np.ndarray]]]
+
+def load_signatures(directory: str) -> Signatures:
+    """Signatures saved by ChunkDeduplicator.save, or an empty mapping."""
+    path = os.path.join(directory, SIGNATURES_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            chunk_ids, digests, signatures, has_signature = (
+                data["chunk_ids"], data["digests"], data["signatures"], data["has_signature"]
+            )
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable {path}: {str(e)}")
+        return {}
+    return {
+        str(chunk_id): (bytes(digest), signature if has else None)
+        for chunk_id, digest, signature, has in zip(chunk_ids, digests, signatures, has_signature)
+    }
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of a chunk's lowercase word shingles."""
+    words = text.lower().split()
+    shingles = {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    hashes = np.array([_hash64(shingle) for shingle in shingles], dtype=np.uint64)
+    # Multiply-add permutations; uint64 arithmetic wraps around
+    return (hashes[:, None] * _PERM_A + _PERM_B).min(axis=0)
+
+class ChunkDeduplicator:
+    """
+    Finds chunks that repeat an already indexed chunk.
+
+    Exact duplicates are found by content hash. Near duplicates (the same
+    boilerplate with a few words changed) are found by MinHash: chunks whose
+    estimated shingle Jaccard similarity is at least threshold. Signatures
+    are split into bands, so only chunks sharing a band are compared. A
+    duplicate is recorded as a ChunkRef on the first chunk seen with that
+    content, which keeps the only vector. Representatives are tracked by
+    chunk id, so indexed chunks are not held as objects.
+    """
+
+    def __init__(self, mode: str = "near", threshold: float = 0.8):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.mode = mode
+        self.threshold = threshold
+        self._exact: Dict[bytes, str] = {}
+        self._bands: List[Dict[bytes, List[Tuple[np.ndarray, str]]]] = [
+            {} for _ in range(MINHASH_BANDS)
+        ]
+        # Digest and signature of every registered chunk, for save()
+        self._signatures: Signatures = {}
+        self.unique = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, MINHASH_BANDS)]
+
+    def _register(self, chunk_id: str, digest: bytes, signature: Optional[np.ndarray]):
+        self._exact[digest] = chunk_id
+        self._signatures[chunk_id] = (digest, signature)
+        if signature is not None:
+            for bucket, key in zip(self._bands, self._band_keys(signature)):
+                bucket.setdefault(key, []).append((signature, chunk_id))
+
+    def seed(self, chunks: Iterable[Tuple[str, str]], saved: Optional[Signatures] = None):
+        """
+        Register already indexed chunks, given as (chunk_id, chunk) pairs.
+
+        Signatures from saved (see load_signatures) are reused when the
+        chunk's digest still matches, so only new chunks are MinHashed.
+        """
+        saved = saved or {}
+        count = hashed = 0
+        for chunk_id, chunk in chunks:
+            digest = hashlib.sha1(chunk.encode("utf-8")).digest()
+            signature = None
+            if self.mode == "near":
+                entry = saved.get(chunk_id)
+                if entry is not None and entry[0] == digest and entry[1] is not None:
+                    signature = entry[1]
+                else:
+                    signature = minhash(chunk)
+                    hashed += 1
+            self._register(chunk_id, digest, signature)
+            count += 1
+        logger.info(f"Seeded deduplication with {count} indexed chunks ({hashed} hashed)")
+
+    def save(self, directory: str, chunk_ids: Iterable[str]):
+        """Write the signatures of the given indexed chunks for the next run's seed()."""
+        entries = [(chunk_id, self._signatures[chunk_id]) for chunk_id in chunk_ids
+                   if chunk_id in self._signatures]
+        empty = np.zeros(MINHASH_PERMUTATIONS, dtype=np.uint64)
+        path = os.path.join(directory, SIGNATURES_FILE)
+        tmp_path = os.path.join(directory, f".{SIGNATURES_FILE}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                chunk_ids=np.array([chunk_id for chunk_id, _ in entries], dtype=str),
+                digests=np.array([digest for _, (digest, _) in entries], dtype="S20"),
+                signatures=np.array(
+                    [signature if signature is not None else empty for _, (_, signature) in entries],
+                    dtype=np.uint64
+                ).reshape(-1, MINHASH_PERMUTATIONS),
+                has_signature=np.array([signature is not None for _, (_, signature) in entries], dtype=bool)
+            )
+        os.replace(tmp_path, path)
+        logger.debug(f"Saved {len(entries)} deduplication signatures")
+
+    def check(self, meta: ChunkMetadata) -> Optional[str]:
+        """
+        Look a chunk up before it is embedded.
+
+        Returns the chunk id of the indexed chunk it duplicates, or None
+        after registering it as a new chunk.
+        """
+        digest = hashlib.sha1(meta.chunk.encode("utf-8")).digest()
+        signature = None
+        if self.mode != "off" and digest in self._exact:
+            self.exact_duplicates += 1
+            return self._exact[digest]
+        if self.mode == "near":
+            signature = minhash(meta.chunk)
+            for bucket, key in zip(self._bands, self._band_keys(signature)):
+                for other, representative in bucket.get(key, [])[-MAX_BUCKET_CANDIDATES:]:
+                    if np.mean(signature == other) >= self.threshold:
+                        self.near_duplicates += 1
+                        return representative
+
+        self.unique += 1
+        if self.mode != "off":
+            self._register(meta.chunk_id, digest, signature)
+        return None
+
+    def discard(self, chunk_ids: Set[str]):
+        """Forget registered chunks that will not be indexed after all."""
+        self._exact = {
+            digest: chunk_id for digest, chunk_id in self._exact.items() if chunk_id not in chunk_ids
+        }
+        for chunk_id in chunk_ids:
+            self._signatures.pop(chunk_id, None)
+        for bucket in self._bands:
+            for key, entries in bucket.items():
+                bucket[key] = [entry for entry in entries if entry[1] not in chunk_ids]
+
+    def stats(self, dimension: Optional[int] = None) -> dict:
+        """Chunk counts, and the vector bytes saved for a given dimension."""
+        duplicates = self.exact_duplicates + self.near_duplicates
+        total = self.unique + duplicates
+        stats = {
+            "chunks": total,
+            "unique": self.unique,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "saved_ratio": duplicates / total if total else 0.0,
+        }
+        if dimension:
+            stats["saved_bytes"] = duplicates * dimension * 4
+        return stats
+
+def chunk_ref(meta: ChunkMetadata) -> ChunkRef:
+    """Reference that points a duplicate chunk at the vector of its representative."""
+    return ChunkRef(url=meta.url, chunk_id=meta.chunk_id, visited_at=meta.visited_at)
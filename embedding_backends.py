@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("embedding_backends")
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Written by onnx_export.py next to the exported graphs
+ONNX_CONFIG_FILE = "encoder.json"
+DEFAULT_ONNX_DIR = os.path.join("onnx_models", DEFAULT_MODEL_NAME)
+
+class EmbeddingBackend(ABC):
+    """
+    Interface for text embedding providers.
+
+    Subclasses implement embed_batch for at most max_batch_size texts;
+    embed_many splits larger inputs into batches and runs up to
+    max_concurrency of them at once.
+    """
+
+    name: str = ""
+    max_batch_size: int = 64
+    max_concurrency: int = 1
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Length of the vectors this backend produces."""
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed up to max_batch_size texts into a float32 (n, dimension) matrix."""
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text."""
+        return self.embed_batch([text])[0]
+
+    def embed_many(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed any number of texts in batches, preserving input order."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        batch_size = min(batch_size or self.max_batch_size, self.max_batch_size)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        if self.max_concurrency > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(self.embed_batch, batches))
+        else:
+            results = [self.embed_batch(batch) for batch in batches]
+        return np.vstack(results).astype(np.float32, copy=False)
+
+    @property
+    def cache_name(self) -> str:
+        """Name query caches key this backend's embeddings on."""
+        return self.name
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the first embedding call will run without loading a model."""
+        return True
+
+    def warm_up(self):
+        """Load models ahead of the first request, where the backend has any."""
+
+    def start_pool(self, num_workers: int):
+        """Start worker processes for encoding, where the backend supports it."""
+        logger.warning(f"{self.name} does not support encode pools, ignoring")
+
+    def stop_pool(self):
+        """Stop a pool started with start_pool."""
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local sentence-transformers model.
+
+    sentence_transformers (and torch) are imported and the model is loaded on
+    first use, so creating the backend is cheap. Call warm_up, e.g. from a
+    background thread, to load it before the first query.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, max_batch_size: int = 256):
+        self.name = model_name
+        self.max_batch_size = max_batch_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+
+                    self._model = SentenceTransformer(self.name)
+                    logger.info(f"Loaded {self.name} in {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self):
+        # One encode also initializes the inference kernels
+        self.embed("warm up")
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, convert_to_numpy=True).astype(np.float32)
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.embed_many(texts)
+
+    def embed_many(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        # The model batches internally, so hand it the whole list
+        batch_size = batch_size or self.max_batch_size
+        if self._pool is not None:
+            embeddings = self.model.encode_multi_process(texts, self._pool, batch_size=batch_size)
+        else:
+            embeddings = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def start_pool(self, num_workers: int):
+        logger.info(f"Starting encode pool with {num_workers} workers")
+        self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * num_workers)
+
+    def stop_pool(self):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    sentence-transformers model exported to ONNX by onnx_export.py.
+
+    Runs the encoder graph in ONNX Runtime, by default the int8 graph from
+    dynamic quantization, with the model's pooling and normalization done
+    in numpy. It reports the source model's name, so stores built with the
+    sentence-transformers backend can be queried with it, but caches its
+    embeddings under onnx-int8:<model> or onnx-fp32:<model>, since they
+    differ slightly from the PyTorch ones. Needs onnxruntime and tokenizers.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = DEFAULT_ONNX_DIR,
+        quantized: bool = True,
+        intra_op_threads: int = 0,
+        max_batch_size: int = 64
+    ):
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.name = self.config["model_name"]
+        self.max_batch_size = max_batch_size
+        self.model_file = os.path.join(model_dir, "model_int8.onnx" if quantized else "model.onnx")
+        self.tokenizer_file = os.path.join(model_dir, "tokenizer.json")
+        self.intra_op_threads = intra_op_threads  # 0 lets ONNX Runtime pick
+        self.variant = "onnx-int8" if quantized else "onnx-fp32"
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        parity = self.config.get("parity", {}).get(os.path.basename(self.model_file))
+        if parity:
+            logger.info(
+                f"{os.path.basename(self.model_file)} agrees with {self.name} "
+                f"to mean cosine {parity['mean_cosine']:.4f} (min {parity['min_cosine']:.4f})"
+            )
+        else:
+            logger.warning(f"No parity check recorded for {self.model_file}; run onnx_export.py --check")
+
+    @property
+    def dimension(self) -> int:
+        return self.config["dimension"]
+
+    @property
+    def cache_name(self) -> str:
+        return f"{self.variant}:{self.name}"
+
+    def _load(self):
+        with self._session_lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.intra_op_threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(self.model_file, options, providers=["CPUExecutionProvider"])
+            self._input_names = {graph_input.name for graph_input in session.get_inputs()}
+
+            self.tokenizer = Tokenizer.from_file(self.tokenizer_file)
+            self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+            self.tokenizer.enable_padding(
+                pad_id=self.config["pad_token_id"],
+                pad_token=self.config["pad_token"]
+            )
+            self._session = session
+            logger.info(f"Loaded {self.model_file} with {self.intra_op_threads or 'default'} intra-op threads")
+
+    @property
+    def loaded(self) -> bool:
+        return self._session is not None
+
+    def warm_up(self):
+        self.embed("warm up")
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if self._session is None:
+            self._load()
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self._session.run(
+            None, {name: value for name, value in feeds.items() if name in self._input_names}
+        )[0]
+
+        if self.config["pooling"] == "cls":
+            embeddings = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config["normalize"]:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings.astype(np.float32, copy=False)
+
+class OllamaBackend(EmbeddingBackend):
+    """Ollama embedding server; concurrency is handled by the pooled client."""
+
+    def __init__(
+        self,
+        model: str = "nomic-embed-text",
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        max_batch_size: int = 32
+    ):
+        from ollama_client import OLLAMA_BASE_URL, OllamaEmbeddingClient
+
+        self.name = f"ollama:{model}"
+        # One call to the client covers many batches, so embed_many stays serial
+        self.max_batch_size = max_batch_size * max_concurrency
+        self.client = OllamaEmbeddingClient(
+            base_url or OLLAMA_BASE_URL,
+            model=model,
+            max_concurrency=max_concurrency,
+            batch_size=max_batch_size
+        )
+        self._dimension: Optional[int] = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = len(self.client.embed("dimension probe"))
+        return self._dimension
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.client.embed(text)
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.client.embed_batch(texts)
+        self._dimension = embeddings.shape[1]
+        return embeddings
+
+class GeminiBackend(EmbeddingBackend):
+    """Google Gemini embedding API."""
+
+    def __init__(
+        self,
+        model: str = "gemini-embedding-exp-03-07",
+        task_type: str = "RETRIEVAL_DOCUMENT",
+        api_key: Optional[str] = None,
+        max_concurrency: int = 2,
+        max_batch_size: int = 100
+    ):
+        from google import genai
+        from google.genai import types
+
+        self.name = f"gemini:{model}"
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.client = genai.Client(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.config = types.EmbedContentConfig(task_type=task_type)
+        self._dimension: Optional[int] = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = len(self.embed("dimension probe"))
+        return self._dimension
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        res = self.client.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=self.config
+        )
+        embeddings = np.array([e.values for e in res.embeddings], dtype=np.float32)
+        self._dimension = embeddings.shape[1]
+        return embeddings
+
+BACKENDS = {
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx": OnnxBackend,
+    "ollama": OllamaBackend,
+    "gemini": GeminiBackend,
+}
+
+def get_backend(name: str = "sentence-transformers", model: Optional[str] = None, **kwargs) -> EmbeddingBackend:
+    """Create an embedding backend by name, optionally overriding its model."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    if model:
+        key = {"sentence-transformers": "model_name", "onnx": "model_dir"}.get(name, "model")
+        kwargs[key] = model
+    logger.info(f"Using {name} embedding backend")
+    return BACKENDS[name](**kwargs)
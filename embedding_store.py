@@ -0,0 +1,305 @@
+import os
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, Sequence
+import numpy as np
+import faiss
+from models import ChunkMetadata
+from metadata_table import MetadataTable
+from index_factory import IndexConfig, build_index, flat_vectors
+from keyword_index import KeywordIndex
+from metadata_filters import FilterIndex
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("embedding_store")
+
+# On-disk layout of a store directory
+STORE_VERSION = 1
+DEFAULT_STORE_DIR = "embedding_store"
+STORE_INFO_FILE = "store.json"      # Version, shape and generation; written last
+EMBEDDINGS_FILE = "embeddings.npy"  # float32 (count, dimension) matrix
+METADATA_COLUMN_FILE = "metadata_{}.npy"  # One file per MetadataTable column
+METADATA_STRINGS_FILE = "metadata_strings.json"  # Interned URLs and chunk id prefixes
+INDEX_FILE = "index.faiss"          # Serialized FAISS index
+KEYWORDS_FILE = "keywords.npz"      # BM25 inverted index over chunk text
+FILTERS_FILE = "filters.npz"        # Domain, URL and visit time lookups for search filters
+LEGACY_EMBEDDINGS_FILE = "embeddings.json"
+# One [url, chunk, chunk_id(, duplicates, visited_at)] row per vector; read
+# from stores written before the metadata columns were saved
+LEGACY_METADATA_FILE = "metadata.jsonl"
+
+class EmbeddingStore:
+    """Embeddings, metadata, FAISS index and lookup indexes loaded from a store directory."""
+
+    def __init__(self, info: dict, embeddings: np.ndarray,
+                 metadata: MetadataTable, index,
+                 keywords: Optional[KeywordIndex] = None,
+                 filter_index: Optional[FilterIndex] = None):
+        self.info = info
+        self.index_config = IndexConfig(**(info.get("index_config") or {}))
+        self.embeddings = embeddings
+        self.metadata = metadata
+        self.index = index
+        self.keywords = keywords
+        self.filter_index = filter_index
+
+    @property
+    def dimension(self) -> int:
+        return self.info["dimension"]
+
+    def __len__(self) -> int:
+        return self.info["count"]
+
+def store_exists(directory: str = DEFAULT_STORE_DIR) -> bool:
+    """Check whether a store has been written to the directory."""
+    return os.path.exists(os.path.join(directory, STORE_INFO_FILE))
+
+def store_generation(directory: str = DEFAULT_STORE_DIR) -> Optional[str]:
+    """Generation id of the store on disk, or None if there is no store."""
+    try:
+        with open(os.path.join(directory, STORE_INFO_FILE), "r") as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+
+def stored_index_config(directory: str = DEFAULT_STORE_DIR) -> Optional[IndexConfig]:
+    """Index configuration recorded in store.json, or None if there is no store."""
+    try:
+        with open(os.path.join(directory, STORE_INFO_FILE), "r") as f:
+            return IndexConfig(**(json.load(f).get("index_config") or {}))
+    except (OSError, ValueError):
+        return None
+
+def _replace_file(directory: Path, name: str, write) -> None:
+    """Write a store file next to its final path and move it into place."""
+    tmp_path = directory / f".{name}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, directory / name)
+
+def save_store(
+    directory: str,
+    embeddings,
+    metadata: Sequence[ChunkMetadata],
+    index=None,
+    model_name: Optional[str] = None,
+    index_config: Optional[IndexConfig] = None,
+    keywords: Optional[KeywordIndex] = None,
+    filter_index: Optional[FilterIndex] = None
+) -> dict:
+    """
+    Write embeddings, metadata and index to a store directory.
+
+    The filter index is built from the metadata if it is not given.
+
+    Every file is written under a temporary name and renamed into place, with
+    store.json last, so readers that already mapped the previous files keep a
+    consistent view.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+
+    if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    elif len(embeddings):
+        matrix = np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    if len(matrix) != len(metadata):
+        raise ValueError(
+            f"Embedding count {len(matrix)} does not match metadata count {len(metadata)}"
+        )
+
+    index_config = index_config or IndexConfig()
+    if index is None and len(matrix):
+        index = build_index(matrix, index_config)
+
+    _replace_file(path, EMBEDDINGS_FILE, lambda f: np.save(f, matrix))
+
+    if not isinstance(metadata, MetadataTable):
+        metadata = MetadataTable(metadata)
+
+    for name, column in metadata.columns().items():
+        _replace_file(path, METADATA_COLUMN_FILE.format(name), lambda f: np.save(f, column))
+    strings = {"urls": metadata.urls.strings, "prefixes": metadata.prefixes.strings}
+    _replace_file(
+        path, METADATA_STRINGS_FILE,
+        lambda f: f.write(json.dumps(strings, ensure_ascii=False).encode("utf-8"))
+    )
+
+    if index is not None:
+        tmp_index = path / f".{INDEX_FILE}.tmp"
+        faiss.write_index(index, str(tmp_index))
+        os.replace(tmp_index, path / INDEX_FILE)
+
+    if keywords is not None:
+        _replace_file(path, KEYWORDS_FILE, keywords.save)
+
+    if filter_index is None:
+        filter_index = FilterIndex.build(metadata)
+    _replace_file(path, FILTERS_FILE, filter_index.save)
+
+    info = {
+        "version": STORE_VERSION,
+        "count": int(matrix.shape[0]),
+        "dimension": int(matrix.shape[1]),
+        "dtype": "float32",
+        "has_index": index is not None,
+        "has_keywords": keywords is not None,
+        "has_metadata_columns": True,
+        "has_filters": True,
+        "model_name": model_name,
+        "index_config": index_config.dict(),
+        "generation": datetime.now().strftime("%Y%m%dT%H%M%S%f"),
+    }
+    _replace_file(
+        path, STORE_INFO_FILE,
+        lambda f: f.write(json.dumps(info, indent=2).encode("utf-8"))
+    )
+    logger.info(f"Saved store with {info['count']} vectors to {directory}")
+    return info
+
+def _load_legacy_metadata(path: Path) -> MetadataTable:
+    """Parse metadata.jsonl; rows go straight into the columns without building ChunkMetadata."""
+    metadata = MetadataTable()
+    with open(path / LEGACY_METADATA_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            metadata.append_row(
+                row[0], row[1], row[2],
+                row[4] if len(row) > 4 else None,
+                [
+                    (ref[0], ref[1], ref[2] if len(ref) > 2 else None)
+                    for ref in row[3]
+                ] if len(row) > 3 else ()
+            )
+    return metadata
+
+def _load_metadata(path: Path, mmap: bool) -> MetadataTable:
+    """MetadataTable over the saved column files, mapped read-only with mmap."""
+    with open(path / METADATA_STRINGS_FILE, "r", encoding="utf-8") as f:
+        strings = json.load(f)
+    columns = {
+        name: np.load(path / METADATA_COLUMN_FILE.format(name), mmap_mode="r" if mmap else None)
+        for name in ("url_refs", "prefix_refs", "ordinals", "visits", "offsets", "text", "duplicates")
+    }
+    return MetadataTable.from_columns(columns, strings["urls"], strings["prefixes"])
+
+def _read_index(path: Path, mmap: bool):
+    """
+    Read index.faiss, mapping its vectors and lists read-only with mmap.
+
+    FAISS versions without IO_FLAG_MMAP_IFC only map IVF inverted lists.
+    """
+    if mmap:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        flags = faiss.IO_FLAG_MMAP if flags is None else flags | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(str(path / INDEX_FILE), flags)
+        except RuntimeError as e:
+            logger.warning(f"Could not memory-map {INDEX_FILE}, reading it instead: {e}")
+    return faiss.read_index(str(path / INDEX_FILE))
+
+def load_store(directory: str = DEFAULT_STORE_DIR, mmap: bool = True) -> EmbeddingStore:
+    """
+    Load a store directory.
+
+    With mmap the embedding matrix, metadata columns and index are mapped
+    read-only, so loading does not copy them and the OS page cache is
+    shared between processes. A mapped exact flat index already holds the
+    vectors, so embeddings.npy is not mapped as well.
+    """
+    path = Path(directory)
+    with open(path / STORE_INFO_FILE, "r") as f:
+        info = json.load(f)
+    if info.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported store version: {info.get('version')}")
+
+    if info.get("has_metadata_columns"):
+        metadata = _load_metadata(path, mmap)
+    else:
+        metadata = _load_legacy_metadata(path)
+
+    index = _read_index(path, mmap) if info.get("has_index") else None
+    embeddings = flat_vectors(index) if mmap and index is not None else None
+    if embeddings is None:
+        embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+
+    store = EmbeddingStore(info, embeddings, metadata, index)
+    if index is None and len(embeddings):
+        store.index = build_index(embeddings, store.index_config)
+    # Stores without keywords.npz get BM25 built on their first hybrid search
+    if info.get("has_keywords"):
+        store.keywords = KeywordIndex.load(str(path / KEYWORDS_FILE))
+    # The filter index is needed before serve.py forks, so older stores
+    # without filters.npz build it here rather than in every worker
+    if info.get("has_filters"):
+        store.filter_index = FilterIndex.load(str(path / FILTERS_FILE), metadata)
+    else:
+        store.filter_index = FilterIndex.build(metadata)
+
+    # A store read while it was being rewritten mixes files of two generations
+    counts = {info["count"], len(embeddings), len(metadata)}
+    if store.keywords is not None:
+        counts.add(len(store.keywords))
+    counts.add(len(store.filter_index))
+    if store.index is not None:
+        counts.add(store.index.ntotal)
+    if len(counts) != 1:
+        raise ValueError(f"Inconsistent store in {directory}: counts {sorted(counts)}")
+
+    logger.info(
+        f"Loaded store with {info['count']} vectors from {directory} "
+        f"({len(metadata.urls)} distinct URLs, {metadata.nbytes / 1e6:.1f} MB of metadata)"
+    )
+    return store
+
+def load_new_generation(
+    directory: str = DEFAULT_STORE_DIR,
+    current: Optional[str] = None,
+    mmap: bool = True
+) -> Optional[EmbeddingStore]:
+    """
+    Load the store if its generation differs from current, else return None.
+
+    Only store.json is read when nothing changed, so polling is cheap. Raises
+    ValueError if the store is replaced while it is being loaded.
+    """
+    generation = store_generation(directory)
+    if generation is None or generation == current:
+        return None
+    store = load_store(directory, mmap=mmap)
+    if store.info.get("generation") != store_generation(directory):
+        raise ValueError(f"Store in {directory} changed while it was being loaded")
+    return store
+
+def convert_json_store(
+    json_path: str = LEGACY_EMBEDDINGS_FILE,
+    directory: str = DEFAULT_STORE_DIR
+) -> dict:
+    """Convert a legacy embeddings.json file into a store directory."""
+    logger.info(f"Converting {json_path} to store at {directory}")
+    with open(json_path, "r") as f:
+        data = json.load(f)
+
+    metadata = [ChunkMetadata(**meta) for meta in data["metadata"]]
+    if data["embeddings"]:
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+    else:
+        embeddings = []
+    del data
+    keywords = KeywordIndex.build(meta.chunk for meta in metadata)
+    return save_store(directory, embeddings, metadata, keywords=keywords)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert embeddings.json into a binary embedding store"
+    )
+    parser.add_argument("--input", default=LEGACY_EMBEDDINGS_FILE)
+    parser.add_argument("--output", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+    info = convert_json_store(args.input, args.output)
+    print(f"Converted {info['count']} vectors to {args.output}")
@@ -1,88 +1,53 @@
-import os
 from pathlib import Path
-import faiss
+from index_factory import IndexConfig, build_index
+from chunking import open_page
 import numpy as np
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
-import time
+from embedding_backends import GeminiBackend
 
 # Load environment variables and initialize Gemini client
 load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+backend = GeminiBackend(max_concurrency=2)  # Keep concurrency low to respect API rate limits
 
 # Configuration
 CHUNK_SIZE = 50  # Words per chunk
 CHUNK_OVERLAP = 10  # Words overlap between chunks
 SCRAPED_TEXTS_PATH = Path("scraped_texts")  # Path to scraped texts
-
-def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    """Split text into overlapping chunks of specified size."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i+size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
+INDEX_TYPE = "flat"  # One of index_factory.INDEX_TYPES
 
 def get_embedding(text: str) -> np.ndarray:
     """Get embedding for text using Gemini API."""
-    res = client.models.embed_content(
-        model="gemini-embedding-exp-03-07",
-        contents=text,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
-    )
-    return np.array(res.embeddings[0].values, dtype=np.float32)
+    return backend.embed(text)
 
 def process_scraped_files():
     """Process all scraped text files and create FAISS index."""
-    all_chunks = []
+    texts = []
     metadata = []
 
     # Process each text file in the scraped_texts directory
     for file in SCRAPED_TEXTS_PATH.glob("*.txt"):
-        with open(file, "r", encoding="utf-8") as f:
-            content = f.read()
-            
-            # Extract URL from the content (first line after "URL: ")
-            url = None
-            for line in content.split('\n'):
-                if line.startswith('URL: '):
-                    url = line[5:].strip()
-                    break
-            
+        with open_page(file, CHUNK_SIZE, CHUNK_OVERLAP) as (url, chunks):
             if not url:
                 continue  # Skip if URL not found
             
-            # Get the actual content (skip the metadata lines)
-            content_lines = content.split('\n\n', 1)
-            if len(content_lines) > 1:
-                actual_content = content_lines[1]
-                
-                # Create chunks
-                chunks = chunk_text(actual_content)
-                
-                # Process each chunk
-                for idx, chunk in enumerate(chunks):
-                    all_chunks.append(get_embedding(chunk))
-                    metadata.append({
-                        "url": url,
-                        "chunk": chunk,
-                        "chunk_id": f"{file.stem}_{idx}"
-                    })
+            # Queue each chunk as it is read; they are embedded in batches below
+            for idx, chunk in enumerate(chunks or []):
+                texts.append(chunk)
+                metadata.append({
+                    "url": url,
+                    "chunk": chunk,
+                    "chunk_id": f"{file.stem}_{idx}"
+                })
         
         print(f"Processed: {file.name}")
-        time.sleep(1)  # Small delay to respect API rate limits
 
-    return all_chunks, metadata
+    if not texts:
+        return [], []
+    return list(backend.embed_many(texts)), metadata
 
 def create_faiss_index(embeddings):
     """Create and return a FAISS index."""
-    dimension = len(embeddings[0])
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.stack(embeddings))
-    return index
+    return build_index(np.stack(embeddings), IndexConfig(index_type=INDEX_TYPE))
 
 def search_history(query, index, metadata, k=3):
     """Search the history using the given query."""
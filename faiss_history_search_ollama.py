@@ -1,92 +1,75 @@
 import os
 from pathlib import Path
-import faiss
+from index_factory import IndexConfig, build_index
+from chunking import open_page
 import numpy as np
 import requests
-import time
+from embedding_backends import OllamaBackend
 
 # Configuration
 CHUNK_SIZE = 50  # Words per chunk
 CHUNK_OVERLAP = 10  # Words overlap between chunks
 SCRAPED_TEXTS_PATH = Path("scraped_texts")  # Path to scraped texts
-OLLAMA_API_URL = "http://localhost:11434/api/embeddings"
+INDEX_TYPE = "flat"  # One of index_factory.INDEX_TYPES
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+MAX_CONCURRENCY = 8  # Embedding requests in flight at once
 
-def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    """Split text into overlapping chunks of specified size."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i+size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
+backend = OllamaBackend(base_url=OLLAMA_BASE_URL, max_concurrency=MAX_CONCURRENCY)
 
 def get_embedding(text: str) -> np.ndarray:
     """Get embedding for text using Ollama API."""
     try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": "nomic-embed-text",
-                "prompt": text
-            }
-        )
-        response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype=np.float32)
+        return backend.embed(text)
     except Exception as e:
         print(f"Error getting embedding: {str(e)}")
         return None
 
 def process_scraped_files():
     """Process all scraped text files and create FAISS index."""
-    all_chunks = []
-    metadata = []
+    texts = []
+    chunk_metadata = []
 
     # Process each text file in the scraped_texts directory
     for file in SCRAPED_TEXTS_PATH.glob("*.txt"):
-        with open(file, "r", encoding="utf-8") as f:
-            content = f.read()
-            
-            # Extract URL from the content (first line after "URL: ")
-            url = None
-            for line in content.split('\n'):
-                if line.startswith('URL: '):
-                    url = line[5:].strip()
-                    break
-            
+        with open_page(file, CHUNK_SIZE, CHUNK_OVERLAP) as (url, chunks):
             if not url:
                 continue  # Skip if URL not found
             
-            # Get the actual content (skip the metadata lines)
-            content_lines = content.split('\n\n', 1)
-            if len(content_lines) > 1:
-                actual_content = content_lines[1]
-                
-                # Create chunks
-                chunks = chunk_text(actual_content)
-                
-                # Process each chunk
-                for idx, chunk in enumerate(chunks):
-                    embedding = get_embedding(chunk)
-                    if embedding is not None:
-                        all_chunks.append(embedding)
-                        metadata.append({
-                            "url": url,
-                            "chunk": chunk,
-                            "chunk_id": f"{file.stem}_{idx}"
-                        })
+            # Queue each chunk as it is read; they are embedded concurrently below
+            for idx, chunk in enumerate(chunks or []):
+                texts.append(chunk)
+                chunk_metadata.append({
+                    "url": url,
+                    "chunk": chunk,
+                    "chunk_id": f"{file.stem}_{idx}"
+                })
         
         print(f"Processed: {file.name}")
-        time.sleep(0.5)  # Small delay to prevent overwhelming the API
 
+    all_chunks = []
+    metadata = []
+    batch_size = backend.max_batch_size
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        try:
+            embeddings = list(backend.embed_batch(batch))
+        except requests.RequestException as e:
+            print(f"Error getting embeddings for chunks {start}-{start + len(batch) - 1}: {str(e)}")
+            # Embed the batch one chunk at a time so only failing chunks are skipped
+            embeddings = [get_embedding(chunk) for chunk in batch]
+        for embedding, meta in zip(embeddings, chunk_metadata[start:start + batch_size]):
+            if embedding is not None:
+                all_chunks.append(embedding)
+                metadata.append(meta)
+
+    report = backend.client.throughput_report()
+    print(f"Embedded {report['texts_embedded']} chunks in {report['busy_seconds']:.1f}s "
+          f"({report['texts_per_second']:.1f} chunks/sec, {report['retries']} retries)")
     return all_chunks, metadata
 
 def create_faiss_index(embeddings):
     """Create and return a FAISS index."""
-    dimension = len(embeddings[0])
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.stack(embeddings))
-    return index
+    return build_index(np.stack(embeddings), IndexConfig(index_type=INDEX_TYPE))
 
 def search_history(query, index, metadata, k=3):
     """Search the history using the given query."""
@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("file_manifest")
+
+MANIFEST_FILE = "files.json"  # Lives next to store.json in the store directory
+HASH_BLOCK_SIZE = 1 << 20
+
+def hash_file(path: Path) -> str:
+    """Compute the sha256 of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(directory: str) -> Dict[str, dict]:
+    """Load the file manifest of a store directory, or an empty one."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_manifest(directory: str, manifest: Dict[str, dict]):
+    """Write the file manifest of a store directory."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.debug(f"Saved manifest with {len(manifest)} files")
+
+def chunk_ids_for(file_key: str, entry: dict) -> List[str]:
+    """Chunk ids that were created for a manifest entry."""
+    stem = Path(file_key).stem
+    return [f"{stem}_{idx}" for idx in range(entry.get("chunks", 0))]
+
+def diff_files(
+    manifest: Dict[str, dict],
+    files: Iterable[Path]
+) -> Tuple[Dict[str, dict], List[str], List[str]]:
+    """
+    Compare files on disk against a manifest.
+
+    Files whose size and mtime match their entry are not re-hashed.
+
+    Returns:
+    - dict: Fingerprints of new or changed files, keyed by path
+    - list: Paths of unchanged files
+    - list: Paths in the manifest that no longer exist
+    """
+    changed = {}
+    unchanged = []
+    seen = set()
+
+    for file in files:
+        key = str(file)
+        seen.add(key)
+        stat = file.stat()
+        old = manifest.get(key)
+        if old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime:
+            unchanged.append(key)
+            continue
+
+        sha256 = hash_file(file)
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        if old and old["sha256"] == sha256:
+            # Touched but identical: keep the chunks, refresh the stat fields
+            old.update(fingerprint)
+            unchanged.append(key)
+        else:
+            changed[key] = fingerprint
+
+    deleted = [key for key in manifest if key not in seen]
+    logger.info(
+        f"Manifest diff: {len(changed)} new or changed, "
+        f"{len(unchanged)} unchanged, {len(deleted)} deleted"
+    )
+    return changed, unchanged, deleted
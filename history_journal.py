@@ -0,0 +1,203 @@
+import os
+import json
+import atexit
+import threading
+from contextlib import contextmanager
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional
+from models import SearchHistory
+from metrics import stage
+from logger_config import setup_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only
+    fcntl = None
+
+# Set up logger
+logger = setup_logger("history_journal")
+
+DEFAULT_JOURNAL_FILE = "search_history.jsonl"
+LEGACY_HISTORY_FILE = "search_history.json"
+
+class HistoryJournal:
+    """
+    Append-only JSONL search history written by a background thread.
+
+    append() only queues the entry, so recording a search is O(1) and does
+    no file I/O on the caller's thread. The writer appends queued entries
+    in batches (when batch_size are pending or every flush_interval
+    seconds) and periodically compacts the file down to the retention
+    limits. Entries are read from disk only when history is first requested.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_JOURNAL_FILE,
+        max_entries: int = 10000,
+        max_age_days: Optional[int] = None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        compact_every: int = 1000,
+        legacy_path: Optional[str] = LEGACY_HISTORY_FILE
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        # Entries not yet on disk; removed only once written, under _io_lock
+        self._pending: List[SearchHistory] = []
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._entries: Optional[deque] = None
+        self._writes_since_compaction = 0
+        self._closed = False
+
+        if legacy_path and os.path.exists(legacy_path) and not os.path.exists(path):
+            self._migrate(legacy_path)
+
+        self._writer = threading.Thread(
+            target=self._run, name="history-journal", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _migrate(self, legacy_path: str):
+        """Convert a legacy search_history.json list into the journal."""
+        try:
+            with open(legacy_path, "r") as f:
+                items = json.load(f)
+            with open(self.path, "w") as f:
+                for item in items[-self.max_entries:]:
+                    f.write(SearchHistory(**item).json() + "\n")
+            logger.info(f"Migrated {len(items)} history entries from {legacy_path}")
+        except Exception as e:
+            logger.error(f"Error migrating history: {str(e)}")
+
+    def append(self, item: SearchHistory):
+        """Record a search without blocking on file I/O."""
+        with self._cond:
+            if self._entries is not None:
+                self._entries.append(item)
+            self._pending.append(item)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def entries(self) -> List[SearchHistory]:
+        """All retained entries, oldest first; loads the journal on first use."""
+        with self._cond:
+            if self._entries is not None:
+                return list(self._entries)
+        with self._io_lock, self._cond:
+            if self._entries is None:
+                # Holding _io_lock, every entry is either on disk or pending
+                self._entries = deque(self._read(), maxlen=self.max_entries)
+                self._entries.extend(self._pending)
+                logger.info(f"Loaded {len(self._entries)} search history entries")
+            return list(self._entries)
+
+    def recent(self, limit: int = 5) -> List[SearchHistory]:
+        """Most recent entries, newest first."""
+        entries = self.entries()
+        return entries[::-1][:limit]
+
+    def _read(self) -> List[SearchHistory]:
+        if not os.path.exists(self.path):
+            logger.info("No existing search history found")
+            return []
+        items = []
+        cutoff = self._cutoff()
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    item = SearchHistory(**json.loads(line))
+                except Exception:
+                    # Torn last line after a crash
+                    continue
+                if cutoff is None or item.timestamp >= cutoff:
+                    items.append(item)
+        return items[-self.max_entries:]
+
+    def _cutoff(self) -> Optional[datetime]:
+        if self.max_age_days is None:
+            return None
+        return datetime.now() - timedelta(days=self.max_age_days)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize appends and compaction across processes sharing the journal."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                batch = self._pending[:self.batch_size]
+                stop = self._closed and len(self._pending) == len(batch)
+
+            if batch:
+                with self._io_lock:
+                    self._write(batch)
+                    with self._cond:
+                        del self._pending[:len(batch)]
+                        self._cond.notify_all()
+            if stop:
+                return
+
+    def _write(self, batch: List[SearchHistory]):
+        if not batch:
+            return
+        try:
+            with stage("history_write"), self._file_lock(), open(self.path, "a") as f:
+                f.write("".join(entry.json() + "\n" for entry in batch))
+            logger.debug("Appended %d search history entries", len(batch))
+        except Exception as e:
+            logger.error(f"Error saving history: {str(e)}")
+            return
+
+        self._writes_since_compaction += len(batch)
+        if self._writes_since_compaction >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal keeping only entries within the retention limits."""
+        try:
+            with self._file_lock():
+                items = self._read()
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write("".join(entry.json() + "\n" for entry in items))
+                os.replace(tmp_path, self.path)
+            self._writes_since_compaction = 0
+            logger.info(f"Compacted search history to {len(items)} entries")
+        except Exception as e:
+            logger.error(f"Error compacting history: {str(e)}")
+
+    def flush(self):
+        """Block until every pending entry has been written."""
+        with self._cond:
+            while self._pending and self._writer.is_alive():
+                self._cond.notify_all()
+                self._cond.wait(self.flush_interval)
+
+    def close(self):
+        """Write pending entries and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join(timeout=5)
@@ -0,0 +1,329 @@
+import json
+import time
+import argparse
+from typing import List, Optional
+import numpy as np
+import faiss
+from pydantic import BaseModel
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("index_factory")
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+METRICS = ("l2", "cosine")  # cosine expects L2-normalized vectors and uses inner product
+QUANTIZATIONS = ("none", "fp16", "int8")  # Scalar quantization of the vectors stored in the index
+MIN_POINTS_PER_CENTROID = 39  # Below this FAISS k-means warns and clusters poorly
+
+class IndexConfig(BaseModel):
+    index_type: str = "flat"
+    metric: str = "l2"
+    # IVF variants
+    nlist: int = 1024
+    nprobe: int = 16
+    # IVF-PQ
+    pq_m: int = 16
+    pq_bits: int = 8
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    # Training
+    train_sample_size: int = 100_000
+    # Scalar quantization (flat, ivf_flat, hnsw): fp16 halves and int8
+    # quarters the memory of stored vectors
+    quantization: str = "none"
+    # Approximate searches fetch k * rerank_factor candidates and re-score
+    # them exactly against the full-precision vectors (0 disables)
+    rerank_factor: int = 0
+
+_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,  # Per-dimension ranges learned in training
+}
+
+def create_index(dimension: int, config: Optional[IndexConfig] = None, num_vectors: int = 0):
+    """
+    Create an empty FAISS index for the configured type.
+
+    IVF list counts are capped by num_vectors so small corpora still train.
+    """
+    config = config or IndexConfig()
+    if config.index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {config.index_type}")
+    if config.metric not in METRICS:
+        raise ValueError(f"Unknown metric: {config.metric}")
+    if config.quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {config.quantization}")
+    if config.quantization != "none" and config.index_type == "ivf_pq":
+        raise ValueError("ivf_pq already compresses vectors; quantization applies to flat, ivf_flat and hnsw")
+    cosine = config.metric == "cosine"
+    metric = faiss.METRIC_INNER_PRODUCT if cosine else faiss.METRIC_L2
+    sq_type = _SQ_TYPES.get(config.quantization)
+
+    if config.index_type == "flat":
+        if sq_type is not None:
+            return faiss.IndexScalarQuantizer(dimension, sq_type, metric)
+        return faiss.IndexFlatIP(dimension) if cosine else faiss.IndexFlatL2(dimension)
+
+    if config.index_type == "hnsw":
+        if sq_type is not None:
+            index = faiss.IndexHNSWSQ(dimension, sq_type, config.hnsw_m, metric)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m, metric)
+        index.hnsw.efConstruction = config.ef_construction
+        index.hnsw.efSearch = config.ef_search
+        return index
+
+    nlist = config.nlist
+    if num_vectors:
+        nlist = max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+    quantizer = faiss.IndexFlatIP(dimension) if cosine else faiss.IndexFlatL2(dimension)
+    if config.index_type == "ivf_flat" and sq_type is not None:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, sq_type, metric)
+    elif config.index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    else:
+        if dimension % config.pq_m != 0:
+            raise ValueError(f"pq_m={config.pq_m} must divide dimension {dimension}")
+        index = faiss.IndexIVFPQ(
+            quantizer, dimension, nlist, config.pq_m, config.pq_bits, metric
+        )
+    index.nprobe = min(config.nprobe, nlist)
+    return index
+
+def train_index(index, vectors: np.ndarray, config: Optional[IndexConfig] = None):
+    """Train an index on a random sample of the vectors if it needs training."""
+    config = config or IndexConfig()
+    if index.is_trained:
+        return
+    sample = vectors
+    if len(vectors) > config.train_sample_size:
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(len(vectors), config.train_sample_size, replace=False))
+        sample = vectors[rows]
+    logger.info(f"Training {config.index_type} index on {len(sample)} vectors")
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of the vectors scaled to unit L2 norm."""
+    vectors = np.array(vectors, dtype=np.float32, order="C", ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def build_index(vectors: np.ndarray, config: Optional[IndexConfig] = None):
+    """Create, train and fill an index with all vectors."""
+    config = config or IndexConfig()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if config.index_type == "ivf_pq" and len(vectors) < 2 ** config.pq_bits:
+        logger.warning(
+            f"Only {len(vectors)} vectors, too few to train PQ codebooks; using a flat index"
+        )
+        config = config.copy(update={"index_type": "flat"})
+
+    index = create_index(vectors.shape[1], config, num_vectors=len(vectors))
+    train_index(index, vectors, config)
+    index.add(vectors)
+    quantized = f" {config.quantization}" if config.quantization != "none" else ""
+    logger.info(f"Built {config.index_type}{quantized} index with {index.ntotal} vectors")
+    return index
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Tune search-time parameters of IVF (nprobe) and HNSW (efSearch) indexes."""
+    if nprobe is not None:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+            ivf.nprobe = min(nprobe, ivf.nlist)
+        except RuntimeError:
+            pass
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+def id_filter_params(index, allowed: np.ndarray):
+    """
+    Search parameters that restrict a search to some ids.
+
+    allowed is either an array of ids or a boolean mask over all ids; a
+    mask becomes a bitmap selector, which costs one bit test per vector.
+    Keeps the index's current nprobe / efSearch. HNSW still walks the
+    whole graph, so very selective filters can return fewer than k results.
+    """
+    if allowed.dtype == bool:
+        selector = faiss.IDSelectorBitmap(np.packbits(allowed, bitorder="little"))
+    else:
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed, dtype=np.int64))
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+
+def supports_remove(index) -> bool:
+    """Whether remove_ids keeps the remaining ids contiguous (flat indexes only)."""
+    return isinstance(index, faiss.IndexFlat)
+
+def flat_vectors(index) -> Optional[np.ndarray]:
+    """
+    The float32 vectors held by an exact flat index, without copying them.
+
+    Returns None for other index types. The array is a view of the index's
+    memory and is only valid while the index is alive.
+    """
+    if not isinstance(index, faiss.IndexFlat):
+        return None
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+def rerank(vectors, queries: np.ndarray, ids: np.ndarray, k: int, cosine: bool):
+    """
+    Re-score candidate ids exactly and keep the best k per query.
+
+    vectors are the full-precision vectors (an array, memory-mapped file or
+    list of rows); ids are the candidates from an approximate search, with
+    -1 for missing results. Returns (scores, ids) shaped like index.search.
+    """
+    scores = np.full((len(queries), k), -np.inf if cosine else np.inf, dtype=np.float32)
+    top_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, candidates) in enumerate(zip(queries, ids)):
+        candidates = candidates[candidates >= 0]
+        if not len(candidates):
+            continue
+        if isinstance(vectors, np.ndarray):
+            # Sorted rows read a memory-mapped file in order
+            order = np.argsort(candidates)
+            rows = np.empty((len(candidates), queries.shape[1]), dtype=np.float32)
+            rows[order] = vectors[candidates[order]]
+        else:
+            rows = np.stack([vectors[i] for i in candidates]).astype(np.float32)
+        if cosine:
+            exact = rows @ query
+            best = np.argsort(-exact, kind="stable")[:k]
+        else:
+            exact = np.sum((rows - query) ** 2, axis=1)
+            best = np.argsort(exact, kind="stable")[:k]
+        scores[row, :len(best)] = exact[best]
+        top_ids[row, :len(best)] = candidates[best]
+    return scores, top_ids
+
+def recall_report(
+    vectors: np.ndarray,
+    configs: List[IndexConfig],
+    k: int = 10,
+    num_queries: int = 500
+) -> List[dict]:
+    """
+    Measure recall@k and query latency of each config against a flat index.
+
+    Queries are rows sampled from the vectors themselves. Each config is
+    compared against a flat index of the same metric.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    queries = vectors[rows]
+
+    truths = {}
+    report = []
+    for config in configs:
+        if config.metric not in truths:
+            flat = build_index(vectors, IndexConfig(index_type="flat", metric=config.metric))
+            truths[config.metric] = flat.search(queries, k)[1]
+        truth = truths[config.metric]
+
+        start = time.perf_counter()
+        index = build_index(vectors, config)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            query = query.reshape(1, -1)
+            if config.rerank_factor > 0 and flat_vectors(index) is None:
+                _, I = index.search(query, k * config.rerank_factor)
+                _, I = rerank(vectors, query, I, k, config.metric == "cosine")
+            else:
+                _, I = index.search(query, k)
+            latencies.append(time.perf_counter() - start)
+            found[i] = I[0]
+
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        latencies_ms = np.array(latencies) * 1000
+        report.append({
+            "config": config.dict(),
+            "num_vectors": len(vectors),
+            "k": k,
+            "recall_at_k": hits / truth.size,
+            "build_seconds": build_seconds,
+            "index_bytes": len(faiss.serialize_index(index)),
+            "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+            "latency_ms_p99": float(np.percentile(latencies_ms, 99)),
+        })
+        logger.info(
+            f"{config.index_type}/{config.quantization}: recall@{k}={report[-1]['recall_at_k']:.3f}, "
+            f"p50={report[-1]['latency_ms_p50']:.3f}ms"
+        )
+    return report
+
+if __name__ == "__main__":
+    from embedding_store import DEFAULT_STORE_DIR, load_store
+
+    parser = argparse.ArgumentParser(
+        description="Compare recall and latency of index types against a flat index"
+    )
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nlist", type=int, default=IndexConfig().nlist)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--pq-m", type=int, default=IndexConfig().pq_m)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, nargs="+", default=["none"],
+                        help="Scalar quantizations to compare for flat, ivf_flat and hnsw")
+    parser.add_argument("--rerank-factor", type=int, default=0,
+                        help="Re-rank k * factor candidates of approximate indexes exactly")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    store = load_store(args.store)
+    metric = store.index_config.metric
+    configs = []
+    for quantization in args.quantization:
+        common = {"metric": metric, "quantization": quantization, "rerank_factor": args.rerank_factor}
+        configs.append(IndexConfig(index_type="flat", **common))
+        for index_type in ("ivf_flat", "ivf_pq"):
+            if index_type == "ivf_pq" and quantization != "none":
+                continue
+            for nprobe in args.nprobe:
+                configs.append(IndexConfig(
+                    index_type=index_type, nlist=args.nlist, nprobe=nprobe, pq_m=args.pq_m, **common
+                ))
+        for ef_search in args.ef_search:
+            configs.append(IndexConfig(index_type="hnsw", ef_search=ef_search, **common))
+
+    report = recall_report(store.embeddings, configs, k=args.k, num_queries=args.queries)
+
+    print(
+        f"\n{'index':<10} {'quant':<6} {'params':<24} {'recall@' + str(args.k):>10} "
+        f"{'p50 ms':>9} {'p99 ms':>9} {'MB':>8}"
+    )
+    for row in report:
+        config = row["config"]
+        if config["index_type"] in ("ivf_flat", "ivf_pq"):
+            params = f"nlist={config['nlist']} nprobe={config['nprobe']}"
+        elif config["index_type"] == "hnsw":
+            params = f"M={config['hnsw_m']} efSearch={config['ef_search']}"
+        else:
+            params = "exact" if config["quantization"] == "none" else "full scan"
+        print(
+            f"{config['index_type']:<10} {config['quantization']:<6} {params:<24} "
+            f"{row['recall_at_k']:>10.3f} {row['latency_ms_p50']:>9.3f} "
+            f"{row['latency_ms_p99']:>9.3f} {row['index_bytes'] / 1e6:>8.2f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,126 @@
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("keyword_index")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; identifiers like ERR_CODE_42 stay one token."""
+    return _TOKEN_RE.findall(text.lower())
+
+class KeywordIndex:
+    """
+    Inverted index over chunk text with BM25 scoring.
+
+    Postings are stored as flat arrays: the documents (vector ids) of term
+    i are doc_ids[offsets[i]:offsets[i + 1]], sorted, with their term
+    frequencies in tfs.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, doc_lengths: np.ndarray):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        # Guard against division by zero for an index of empty chunks
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.avg_length = self.avg_length or 1.0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "KeywordIndex":
+        """Index texts; the i-th text gets document id i."""
+        postings = {}
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            entries = np.asarray(postings[term])
+            doc_ids[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            tfs[offsets[i]:offsets[i + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+        logger.info(f"Built keyword index with {len(terms)} terms over {len(doc_lengths)} chunks")
+        return cls(terms, offsets, doc_ids, tfs, np.asarray(doc_lengths, dtype=np.int32))
+
+    def save(self, file):
+        """Write the index as .npz to a path or binary file object."""
+        terms = sorted(self.terms, key=self.terms.get)
+        np.savez(
+            file,
+            terms=np.asarray(terms, dtype=str),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordIndex":
+        with np.load(path) as data:
+            return cls(
+                data["terms"].tolist(),
+                data["offsets"],
+                data["doc_ids"],
+                data["tfs"],
+                data["doc_lengths"]
+            )
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self.terms.get(term)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def matching(self, query: str) -> np.ndarray:
+        """Ids of chunks containing every query term (empty if any term is unknown)."""
+        ids = None
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                return np.zeros(0, dtype=np.int64)
+            ids = postings[0] if ids is None else np.intersect1d(ids, postings[0], assume_unique=True)
+        return np.zeros(0, dtype=np.int64) if ids is None else ids.astype(np.int64)
+
+    def search(self, query: str, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Top k chunk ids by BM25 score, best first, with their scores."""
+        ids, scores = [], []
+        n = len(self)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            doc_ids, tfs = postings
+            idf = np.log(1.0 + (n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[doc_ids] / self.avg_length)
+            ids.append(doc_ids)
+            scores.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        unique_ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        top = np.argsort(-totals, kind="stable")[:k]
+        return unique_ids[top].astype(np.int64), totals[top].astype(np.float32)
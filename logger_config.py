@@ -1,26 +1,57 @@
 import logging
+import logging.handlers
 import os
+import queue
+import time
+import atexit
+import threading
 from datetime import datetime
 
-def setup_logger(name: str) -> logging.Logger:
+# Level of every module logger (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.environ.get("RAG_LOG_LEVEL", "INFO").upper()
+
+# Hand records to a background thread instead of writing them on the caller's thread
+LOG_ASYNC = os.environ.get("RAG_LOG_ASYNC", "1") == "1"
+
+# Debug records emitted per second from each logging call; 0 emits all of them
+LOG_DEBUG_RATE = float(os.environ.get("RAG_LOG_DEBUG_RATE", "10"))
+
+_lock = threading.Lock()
+_handlers = None            # File and console handlers shared by every logger
+_queue_handler = None       # Set in async mode; the only handler attached to loggers
+_listener = None
+
+class DebugRateLimit(logging.Filter):
     """
-    Set up and configure a logger with file and console handlers.
-    
-    Args:
-        name: Name of the logger/module
-        
-    Returns:
-        Configured logger instance
+    Drop DEBUG records beyond max_per_second from each logging call.
+
+    Records are keyed by module and line, so a debug line inside a per-result
+    loop is sampled without hiding debug lines elsewhere.
     """
+
+    def __init__(self, max_per_second: float):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self._windows = {}  # (pathname, lineno) -> [window start, records in window]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.max_per_second <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= 1.0:
+            self._windows[key] = [now, 1]
+            return True
+        window[1] += 1
+        return window[1] <= self.max_per_second
+
+def _create_handlers():
     # Create logs directory if it doesn't exist
     logs_dir = "logs"
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
-    
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
+
     # Create formatters
     file_formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -28,23 +59,71 @@ def setup_logger(name: str) -> logging.Logger:
     console_formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - %(message)s'
     )
-    
-    # File handler - daily rotating log file
+
+    # File handler - daily log file
     log_file = os.path.join(
         logs_dir,
         f"{datetime.now().strftime('%Y-%m-%d')}.log"
     )
     file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(file_formatter)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger 
\ No newline at end of file
+
+    return [file_handler, console_handler]
+
+def _start_listener():
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_handlers)
+    _listener.start()
+
+def _configure():
+    global _handlers, _queue_handler
+    _handlers = _create_handlers()
+    if not LOG_ASYNC:
+        for handler in _handlers:
+            handler.addFilter(DebugRateLimit(LOG_DEBUG_RATE))
+        return
+    # The rate limit runs on the queue handler, so dropped records are never queued
+    _queue_handler = logging.handlers.QueueHandler(None)
+    _queue_handler.addFilter(DebugRateLimit(LOG_DEBUG_RATE))
+    _start_listener()
+    atexit.register(flush_logs)
+    if hasattr(os, "register_at_fork"):
+        # The listener thread does not survive fork; give each child its own
+        os.register_at_fork(after_in_child=_start_listener)
+
+def flush_logs():
+    """Write out queued records; call before os._exit, which skips atexit."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def setup_logger(name: str) -> logging.Logger:
+    """
+    Set up and configure a logger with file and console handlers.
+
+    The handlers are created once per process and shared, so calling this
+    again for the same name returns the logger without adding handlers. In
+    async mode the logger only enqueues records and a listener thread writes
+    them.
+
+    Args:
+        name: Name of the logger/module
+
+    Returns:
+        Configured logger instance
+    """
+    with _lock:
+        if _handlers is None:
+            _configure()
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    for handler in [_queue_handler] if _queue_handler is not None else _handlers:
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+
+    return logger
@@ -5,24 +5,18 @@ from perception import extract_perception
 from decision import generate_search_plan
 from action import execute_search, show_search_history
 from models import ChunkMetadata
-import json
-import numpy as np
-import faiss
+from chunking import open_page
+from embedding_store import (
+    DEFAULT_STORE_DIR,
+    LEGACY_EMBEDDINGS_FILE,
+    convert_json_store,
+    store_exists
+)
 from logger_config import setup_logger
 
 # Set up logger
 logger = setup_logger("main")
 
-def chunk_text(text: str, size: int = 50, overlap: int = 10) -> list:
-    """Split text into overlapping chunks."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i+size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
-
 def initialize_memory():
     """Initialize memory with scraped texts."""
     memory = MemoryManager()
@@ -30,36 +24,19 @@ def initialize_memory():
     
     print("Processing scraped history files...")
     for file in scraped_texts_path.glob("*.txt"):
-        with open(file, "r", encoding="utf-8") as f:
-            content = f.read()
-            
-            # Extract URL
-            url = None
-            for line in content.split('\n'):
-                if line.startswith('URL: '):
-                    url = line[5:].strip()
-                    break
-            
+        with open_page(file) as (url, chunks):
             if not url:
                 continue
             
-            # Get actual content
-            content_lines = content.split('\n\n', 1)
-            if len(content_lines) > 1:
-                actual_content = content_lines[1]
-                
-                # Create chunks
-                chunks = chunk_text(actual_content)
-                
-                # Process each chunk
-                for idx, chunk in enumerate(chunks):
-                    metadata = ChunkMetadata(
-                        url=url,
-                        chunk=chunk,
-                        chunk_id=f"{file.stem}_{idx}"
-                    )
-                    embedding = memory.get_embedding(chunk)
-                    memory.add_chunk(metadata, embedding)
+            # Process each chunk as it is read
+            for idx, chunk in enumerate(chunks or []):
+                metadata = ChunkMetadata(
+                    url=url,
+                    chunk=chunk,
+                    chunk_id=f"{file.stem}_{idx}"
+                )
+                embedding = memory.get_embedding(chunk)
+                memory.add_chunk(metadata, embedding)
         
         print(f"Processed: {file.name}")
     
@@ -67,29 +44,18 @@ def initialize_memory():
 
 def load_embeddings():
     """Load pre-computed embeddings and metadata."""
-    memory = MemoryManager()
-    embeddings_file = "embeddings.json"
-    
-    if not os.path.exists(embeddings_file):
-        logger.error("embeddings.json not found! Please run create_embedding.py first.")
-        return None
+    if not store_exists(DEFAULT_STORE_DIR):
+        if not os.path.exists(LEGACY_EMBEDDINGS_FILE):
+            logger.error("Embedding store not found! Please run create_embedding.py first.")
+            return None
+        logger.warning(f"Converting legacy {LEGACY_EMBEDDINGS_FILE} to {DEFAULT_STORE_DIR}")
+        convert_json_store(LEGACY_EMBEDDINGS_FILE, DEFAULT_STORE_DIR)
     
     try:
-        with open(embeddings_file, 'r') as f:
-            data = json.load(f)
-            
-        # Load metadata
-        for meta_dict in data["metadata"]:
-            memory.metadata.append(ChunkMetadata(**meta_dict))
-        
-        # Load embeddings
-        memory.embeddings = [np.array(emb) for emb in data["embeddings"]]
-        
-        # Initialize FAISS index
-        if memory.embeddings:
-            memory.index = faiss.IndexFlatL2(len(memory.embeddings[0]))
-            memory.index.add(np.stack(memory.embeddings))
-        
+        memory = MemoryManager()
+        memory.load_store(DEFAULT_STORE_DIR)
+        # Load the model while the user types the first query
+        memory.warm_up()
         logger.info(f"Successfully loaded {len(memory.metadata)} chunks")
         return memory
     
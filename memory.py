@@ -1,109 +1,737 @@
 import os
 from pathlib import Path
-import faiss
+import weakref
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Optional
-from models import ChunkMetadata, SearchHistory
-import json
+from typing import List, Optional, Tuple
+from models import ChunkMetadata, ChunkRef, SearchFilters, SearchHistory
 from datetime import datetime
 from logger_config import setup_logger
+from embedding_backends import DEFAULT_MODEL_NAME, EmbeddingBackend, SentenceTransformerBackend
+from history_journal import DEFAULT_JOURNAL_FILE, HistoryJournal
+from search_coalescer import SearchCoalescer
+from query_cache import QueryEmbeddingCache
+from index_factory import (
+    IndexConfig,
+    build_index,
+    create_index,
+    normalize_vectors,
+    flat_vectors,
+    id_filter_params,
+    rerank,
+    set_search_params,
+    supports_remove
+)
+from keyword_index import KeywordIndex
+from metadata_filters import FilterIndex
+from metadata_table import MetadataTable
+from embedding_store import (
+    DEFAULT_STORE_DIR,
+    EmbeddingStore,
+    load_new_generation,
+    load_store,
+    save_store
+)
+from metrics import stage
 
 # Set up logger
 logger = setup_logger("memory")
 
+# Reciprocal rank fusion constant; larger values flatten the rank weights
+RRF_K = 60
+# Hybrid search fuses this many candidates per ranking, times k
+HYBRID_DEPTH_FACTOR = 4
+
+class IndexSnapshot:
+    """
+    One generation of searchable data.
+
+    Searches read MemoryManager's current snapshot once and use only that
+    object, so a reload swaps in a new generation atomically and the old one
+    is freed when the last search holding it finishes.
+    """
+
+    __slots__ = (
+        "generation", "index", "metadata", "embeddings", "index_config",
+        "keywords", "filter_index", "__weakref__"
+    )
+
+    def __init__(self, generation, index, metadata, embeddings, index_config: IndexConfig,
+                 keywords: Optional[KeywordIndex] = None,
+                 filter_index: Optional[FilterIndex] = None):
+        self.generation = generation
+        self.index = index
+        self.metadata = metadata
+        self.embeddings = embeddings
+        self.index_config = index_config
+        self.keywords = keywords
+        self.filter_index = filter_index
+
+    def replace(self, **changes) -> "IndexSnapshot":
+        """Copy of this snapshot with some fields replaced."""
+        fields = {name: getattr(self, name) for name in self.__slots__[:-1]}
+        fields.update(changes)
+        return IndexSnapshot(**fields)
+
+    @property
+    def cosine(self) -> bool:
+        return self.index_config.metric == "cosine"
+
 class MemoryManager:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        logger.info(f"Initializing MemoryManager with model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.index = None
-        self.metadata: List[ChunkMetadata] = []
-        self.embeddings: List[np.ndarray] = []
-        self.search_history: List[SearchHistory] = []
-        self.history_file = "search_history.json"
-        self._load_history()
-
-    def _load_history(self):
-        """Load search history from file if it exists."""
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r') as f:
-                    history_data = json.load(f)
-                    self.search_history = [
-                        SearchHistory(**item) for item in history_data
-                    ]
-                logger.info(f"Loaded {len(self.search_history)} search history entries")
-            except Exception as e:
-                logger.error(f"Error loading history: {str(e)}")
-        else:
-            logger.info("No existing search history found")
-
-    def _save_history(self):
-        """Save search history to file."""
-        try:
-            with open(self.history_file, 'w') as f:
-                json.dump(
-                    [history.dict() for history in self.search_history],
-                    f,
-                    default=str
-                )
-            logger.debug(f"Saved {len(self.search_history)} search history entries")
-        except Exception as e:
-            logger.error(f"Error saving history: {str(e)}")
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        backend: Optional[EmbeddingBackend] = None,
+        query_cache_size: int = 1024,
+        query_cache_policy: str = "lru",
+        query_cache_path: Optional[str] = None,
+        index_config: Optional[IndexConfig] = None,
+        history_file: str = DEFAULT_JOURNAL_FILE,
+        history_max_entries: int = 10000,
+        prefilter_fraction: float = 0.01
+    ):
+        self.backend = backend or SentenceTransformerBackend(model_name)
+        # Identifies the embedding space in stores
+        self.model_name = self.backend.name
+        # Keys query cache entries; also names the backend variant (e.g. onnx-int8)
+        self.cache_name = self.backend.cache_name
+        logger.info(f"Initializing MemoryManager with model: {self.model_name}")
+        self._snapshot = IndexSnapshot(None, None, MetadataTable(), [], index_config or IndexConfig())
+        self._search_params = {}
+        # Serializes generation swaps with the lazy keyword and filter index builds
+        self._swap_lock = threading.Lock()
+        # Overrides the store's rerank_factor when set
+        self.rerank_factor: Optional[int] = None
+        self.query_cache = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(
+                max_size=query_cache_size,
+                policy=query_cache_policy,
+                spill_path=query_cache_path
+            )
+        self.history = HistoryJournal(history_file, max_entries=history_max_entries)
+        self.coalescer: Optional[SearchCoalescer] = None
+        # Hybrid searches whose terms all occur in at most this fraction of
+        # chunks only search those chunks
+        self.prefilter_fraction = prefilter_fraction
+
+    # The fields below live in the current snapshot. Assigning them replaces
+    # the snapshot; that is how ingestion builds a store before serving it.
+    @property
+    def index(self):
+        return self._snapshot.index
+
+    @index.setter
+    def index(self, index):
+        self._snapshot = self._snapshot.replace(index=index)
+
+    @property
+    def metadata(self) -> MetadataTable:
+        return self._snapshot.metadata
+
+    @metadata.setter
+    def metadata(self, metadata: MetadataTable):
+        self._snapshot = self._snapshot.replace(metadata=metadata)
+
+    @property
+    def embeddings(self):
+        """
+        Full-precision vectors not held by the index, or None.
+
+        An exact flat index already stores every vector as float32, so no
+        second copy is kept; vectors() reads them back from the index.
+        """
+        return self._snapshot.embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings):
+        self._snapshot = self._snapshot.replace(embeddings=embeddings)
+
+    @property
+    def index_config(self) -> IndexConfig:
+        return self._snapshot.index_config
+
+    @index_config.setter
+    def index_config(self, index_config: IndexConfig):
+        self._snapshot = self._snapshot.replace(index_config=index_config)
+
+    @property
+    def keywords(self) -> Optional[KeywordIndex]:
+        return self._snapshot.keywords
+
+    @keywords.setter
+    def keywords(self, keywords: Optional[KeywordIndex]):
+        self._snapshot = self._snapshot.replace(keywords=keywords)
+
+    @property
+    def filter_index(self) -> Optional[FilterIndex]:
+        return self._snapshot.filter_index
+
+    @filter_index.setter
+    def filter_index(self, filter_index: Optional[FilterIndex]):
+        self._snapshot = self._snapshot.replace(filter_index=filter_index)
+
+    @property
+    def generation(self) -> Optional[str]:
+        """Generation id of the store currently being searched."""
+        return self._snapshot.generation
+
+    @property
+    def search_history(self) -> List[SearchHistory]:
+        """All retained search history entries, oldest first."""
+        return self.history.entries()
 
     def add_to_history(self, query: str, num_results: int, result_urls: List[str]):
         """Add a search to history."""
-        logger.info(f"Adding search to history: {query}")
-        history_item = SearchHistory(
-            query=query,
-            timestamp=datetime.now(),
-            num_results=num_results,
-            result_urls=result_urls
-        )
-        self.search_history.append(history_item)
-        self._save_history()
+        logger.debug("Adding search to history: %s", query)
+        with stage("history"):
+            history_item = SearchHistory(
+                query=query,
+                timestamp=datetime.now(),
+                num_results=num_results,
+                result_urls=result_urls
+            )
+            self.history.append(history_item)
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the embedding model before the first query.
+
+        With background set, loads on a daemon thread and returns it, so
+        the caller can start serving; queries that arrive first wait for
+        the load to finish.
+        """
+        def run():
+            try:
+                self.backend.warm_up()
+            except Exception as e:
+                logger.error(f"Error warming up embedding model: {str(e)}")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
 
     def get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding for text using Sentence Transformer model."""
-        logger.debug(f"Generating embedding for text of length {len(text)}")
-        return self.model.encode(text, convert_to_numpy=True).astype(np.float32)
+        """Get embedding for text using the embedding backend."""
+        logger.debug("Generating embedding for text of length %d", len(text))
+        return self.backend.embed(text)
 
     def add_chunk(self, metadata: ChunkMetadata, embedding: np.ndarray):
         """Add a chunk and its embedding to the index."""
-        logger.debug(f"Adding chunk {metadata.chunk_id} from {metadata.url}")
-        self.metadata.append(metadata)
-        self.embeddings.append(embedding)
+        logger.debug("Adding chunk %s from %s", metadata.chunk_id, metadata.url)
+        self.add_chunks([metadata], np.stack([embedding]))
+
+    def vectors(self, snapshot: Optional[IndexSnapshot] = None):
+        """Full-precision vectors of a snapshot (the current one by default)."""
+        snapshot = snapshot or self._snapshot
+        if snapshot.embeddings is not None:
+            return snapshot.embeddings
+        return flat_vectors(snapshot.index)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """Vector dimension, or None before any vector is added."""
+        vectors = self.vectors()
+        return len(vectors[0]) if vectors is not None and len(vectors) else None
 
-        # Initialize or update index
-        if self.index is None:
+    @property
+    def cosine(self) -> bool:
+        """Whether vectors are normalized and scored by cosine similarity."""
+        return self._snapshot.cosine
+
+    def _index_vectors(self, embeddings: np.ndarray):
+        """Add vectors to the index, deferring indexes that need training."""
+        config = self.index_config
+        if self.index is None and config.index_type == "flat" and config.quantization == "none":
             logger.info("Initializing FAISS index")
-            self.index = faiss.IndexFlatL2(len(embedding))
-        self.index.add(np.stack([embedding]))
+            self.index = create_index(embeddings.shape[1], self.index_config)
+        if self.index is not None:
+            self.index.add(embeddings)
+
+    def ensure_index(self):
+        """Build the configured index from all embeddings if it is not built yet."""
+        if self.index is None and self.embeddings is not None and len(self.embeddings):
+            self.index = build_index(np.vstack(self.embeddings), self.index_config)
+            self.set_search_params(
+                nprobe=self.index_config.nprobe,
+                ef_search=self.index_config.ef_search
+            )
+            if flat_vectors(self.index) is not None:
+                # The index now holds the only copy of the vectors
+                self.embeddings = None
+        return self.index
+
+    def rebuild_index(self, index_config: IndexConfig):
+        """Switch to another index configuration; the index is rebuilt on next use."""
+        if self.embeddings is None:
+            # Copy the vectors out of the flat index before dropping it
+            vectors = self.vectors()
+            self.embeddings = np.array(vectors) if vectors is not None else []
+        self.index_config = index_config
+        self.index = None
+
+    def ensure_keywords(self) -> Optional[KeywordIndex]:
+        """Build the keyword index over all chunks if it is not built yet."""
+        if self.keywords is None and len(self.metadata):
+            self.keywords = KeywordIndex.build(self.metadata.chunks())
+        return self.keywords
+
+    def ensure_filter_index(self) -> Optional[FilterIndex]:
+        """Build the URL and visit time filter index if it is not built yet."""
+        if self.filter_index is None and len(self.metadata):
+            self.filter_index = FilterIndex.build(self.metadata)
+        return self.filter_index
+
+    def set_search_params(
+        self,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        rerank_factor: Optional[int] = None
+    ):
+        """Tune search-time parameters of approximate indexes, including reloaded ones."""
+        if rerank_factor is not None:
+            self.rerank_factor = rerank_factor
+        if nprobe is not None:
+            self._search_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self._search_params["ef_search"] = ef_search
+        if self.index is not None:
+            set_search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        """Get embedding for a search query, served from the query cache when possible."""
+        with stage("embedding"):
+            if self.query_cache is None:
+                return self.get_embedding(query)
+            return self.query_cache.get_or_compute(query, self.cache_name, self.get_embedding)
+
+    def get_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Get embeddings for a batch of texts using the embedding backend."""
+        logger.debug("Generating embeddings for %d texts", len(texts))
+        return self.backend.embed_many(texts, batch_size=batch_size)
+
+    def start_encode_pool(self, num_workers: int):
+        """Start worker processes for batched encoding, if the backend supports them."""
+        self.backend.start_pool(num_workers)
+
+    def stop_encode_pool(self):
+        """Stop a pool started with start_encode_pool."""
+        self.backend.stop_pool()
 
-    def search(self, query: str, k: int = 3) -> List[tuple[ChunkMetadata, float]]:
-        """Search for similar chunks."""
-        if not self.index or len(self.metadata) == 0:
+    def add_chunks(self, metadata: List[ChunkMetadata], embeddings: np.ndarray):
+        """Add a batch of chunks and their embeddings to the index in one call."""
+        if len(metadata) == 0:
+            return
+        if self.cosine:
+            embeddings = normalize_vectors(embeddings)
+        else:
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        logger.debug("Adding %d chunks", len(metadata))
+        self.metadata.extend(metadata)
+        self._index_vectors(embeddings)
+        if flat_vectors(self.index) is not None:
+            # The exact index holds the only copy of the vectors
+            self.embeddings = None
+        else:
+            if not isinstance(self.embeddings, list):
+                # Loaded read-only from a store: make it appendable
+                self.embeddings = list(np.asarray(self.embeddings))
+            self.embeddings.extend(embeddings)
+        self.keywords = None
+        self.filter_index = None
+
+    def remove_chunks(self, chunk_ids: List[str]) -> int:
+        """
+        Remove chunks by id, keeping the remaining vectors in order.
+
+        A vector shared by duplicate chunks is kept while any of them
+        remains. Returns the number of vectors removed.
+        """
+        rows = self.metadata.remove(chunk_ids)
+        if rows:
+            logger.info(f"Removing {len(rows)} chunks from the index")
+            keep = np.ones(len(self.metadata), dtype=bool)
+            keep[rows] = False
+            self.metadata = self.metadata.select(keep)
+            if self.embeddings is not None:
+                self.embeddings = list(np.asarray(self.embeddings)[keep])
+            if self.index is not None and supports_remove(self.index):
+                self.index.remove_ids(np.asarray(rows, dtype=np.int64))
+            else:
+                # Approximate indexes do not renumber ids; rebuild on next use
+                self.index = None
+            self.keywords = None
+        # Dropped duplicate references change the filter entries too
+        self.filter_index = None
+        return len(rows)
+
+    def add_duplicates(self, references: List[Tuple[str, ChunkRef]]):
+        """Record duplicate chunks given as (representative chunk id, reference)."""
+        missing = self.metadata.add_duplicates(references)
+        if missing:
+            logger.warning(f"Dropped {missing} duplicate references to chunks that are not indexed")
+        self.filter_index = None
+
+    def load_store(self, directory: str = DEFAULT_STORE_DIR, mmap: bool = True):
+        """Load embeddings, metadata and index from a store directory."""
+        return self.attach_store(load_store(directory, mmap=mmap))
+
+    def reload_store(self, directory: str = DEFAULT_STORE_DIR, mmap: bool = True) -> bool:
+        """
+        Swap in a newly written store without interrupting searches.
+
+        The new generation is loaded and checked before the swap; searches
+        already running finish on the old one. Returns False if the store
+        on disk is the generation already being served.
+        """
+        current = self.generation if self._snapshot.index is not None else None
+        store = load_new_generation(directory, current, mmap=mmap)
+        if store is None:
+            return False
+        self.attach_store(store)
+        return True
+
+    def attach_store(self, store: EmbeddingStore):
+        """Use an already loaded store; its arrays and index are shared, not copied."""
+        if store.info.get("model_name") not in (None, self.model_name):
+            logger.warning(
+                f"Store was built with {store.info['model_name']}, "
+                f"but queries are embedded with {self.model_name}"
+            )
+        if store.index is not None and self._search_params:
+            set_search_params(store.index, **self._search_params)
+
+        with self._swap_lock:
+            old = self._snapshot
+            self._snapshot = IndexSnapshot(
+                store.info.get("generation"),
+                store.index,
+                store.metadata,
+                store.embeddings,
+                store.index_config,
+                store.keywords,
+                store.filter_index
+            )
+        if old.index is not None:
+            logger.info(f"Swapped index generation {old.generation} for {self.generation}")
+            weakref.finalize(old, logger.info, f"Released index generation {old.generation}")
+        return store
+
+    def save_store(self, directory: str = DEFAULT_STORE_DIR) -> dict:
+        """Save embeddings, metadata and index to a store directory."""
+        index = self.ensure_index()
+        return save_store(
+            directory,
+            self.vectors(),
+            self.metadata,
+            index=index,
+            model_name=self.model_name,
+            index_config=self.index_config,
+            keywords=self.ensure_keywords(),
+            filter_index=self.filter_index
+        )
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        min_score: Optional[float] = None,
+        hybrid: bool = False,
+        filters: Optional[SearchFilters] = None
+    ) -> List[tuple[ChunkMetadata, float]]:
+        """
+        Search for similar chunks.
+
+        Scores are cosine similarities (higher is better) in cosine mode and
+        L2 distances (lower is better) otherwise. min_score drops cosine
+        results below the threshold, so fewer than k may be returned.
+        hybrid fuses vector and BM25 keyword rankings (see _hybrid_search).
+        filters restrict the search to matching URLs and visit times inside
+        the FAISS search. With coalescing enabled, concurrent unfiltered
+        vector searches are answered in batches.
+        """
+        filtered = filters is not None and not filters.is_empty()
+        if self._serving_snapshot(hybrid, filtered) is None:
             logger.warning("No index available for search")
             return []
+        if self.coalescer is not None and not hybrid and not filtered:
+            return self.coalescer.search(query, k=k, min_score=min_score)
+
+        logger.debug("Searching for query: %s with k=%d", query, k)
+        snapshot = self._serving_snapshot(hybrid, filtered)
+        query_vec = self.get_query_embedding(query).reshape(1, -1)
+        if hybrid or filtered:
+            results = self._search_one(snapshot, query, query_vec, k, min_score, hybrid, filters)
+        else:
+            results = self._search_vectors(snapshot, query_vec, k, [min_score])[0]
 
-        logger.info(f"Searching for query: {query} with k={k}")
-        query_vec = self.get_embedding(query).reshape(1, -1)
-        D, I = self.index.search(query_vec, k)
+        logger.debug("Search completed with %d results", len(results))
+        return results
 
-        results = []
-        for idx, distance in zip(I[0], D[0]):
-            if idx < len(self.metadata):
-                results.append((self.metadata[idx], float(distance)))
-                logger.debug(f"Found match with distance {distance:.4f}")
+    def enable_coalescing(self, window_ms: float = 2.0, max_batch_size: int = 32):
+        """Answer concurrent search() calls with micro-batched search_batch calls."""
+        if self.coalescer is None:
+            self.coalescer = SearchCoalescer(self, window_ms=window_ms, max_batch_size=max_batch_size)
+        return self.coalescer
 
-        logger.info(f"Search completed with {len(results)} results")
+    def get_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """Get embeddings for many queries, encoding all cache misses in one batch."""
+        with stage("embedding"):
+            if self.query_cache is None:
+                return self.get_embeddings(queries)
+
+            cached = [self.query_cache.get(query, self.cache_name) for query in queries]
+            missing = {}
+            for i, embedding in enumerate(cached):
+                if embedding is None:
+                    missing.setdefault(queries[i], []).append(i)
+            if missing:
+                embeddings = self.get_embeddings(list(missing))
+                for (query, rows), embedding in zip(missing.items(), embeddings):
+                    self.query_cache.put(query, self.cache_name, embedding)
+                    for i in rows:
+                        cached[i] = embedding
+            return np.vstack(cached)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 3,
+        min_score: Optional[float] = None,
+        ks: Optional[List[int]] = None,
+        min_scores: Optional[List[Optional[float]]] = None,
+        hybrid: bool = False,
+        hybrids: Optional[List[bool]] = None,
+        filters: Optional[SearchFilters] = None,
+        filters_per_query: Optional[List[Optional[SearchFilters]]] = None
+    ) -> List[List[tuple[ChunkMetadata, float]]]:
+        """
+        Search for many queries with one batched encode and one index.search.
+
+        ks, min_scores, hybrids and filters_per_query override k,
+        min_score, hybrid and filters per query. Hybrid and filtered
+        queries share the batched encode but are searched one at a time.
+        Returns one result list per query, in order.
+        """
+        if not queries:
+            return []
+        hybrids = hybrids or [hybrid] * len(queries)
+        filters_per_query = filters_per_query or [filters] * len(queries)
+        single = [
+            is_hybrid or (query_filters is not None and not query_filters.is_empty())
+            for is_hybrid, query_filters in zip(hybrids, filters_per_query)
+        ]
+        snapshot = self._serving_snapshot(any(hybrids), any(
+            query_filters is not None and not query_filters.is_empty()
+            for query_filters in filters_per_query
+        ))
+        if snapshot is None:
+            logger.warning("No index available for search")
+            return [[] for _ in queries]
+
+        ks = ks or [k] * len(queries)
+        min_scores = min_scores or [min_score] * len(queries)
+        logger.debug("Searching for %d queries with k=%d", len(queries), max(ks))
+        query_vecs = self.get_query_embeddings(queries)
+
+        results = [None] * len(queries)
+        dense = [i for i, is_single in enumerate(single) if not is_single]
+        if dense:
+            rows = self._search_vectors(
+                snapshot,
+                query_vecs[dense],
+                max(ks[i] for i in dense),
+                [min_scores[i] for i in dense]
+            )
+            for i, row in zip(dense, rows):
+                results[i] = row
+        for i, is_single in enumerate(single):
+            if is_single:
+                results[i] = self._search_one(
+                    snapshot, queries[i], query_vecs[i:i + 1], ks[i],
+                    min_scores[i], hybrids[i], filters_per_query[i]
+                )
+        return [rows[:query_k] for rows, query_k in zip(results, ks)]
+
+    def _serving_snapshot(self, hybrid: bool = False, filtered: bool = False) -> Optional[IndexSnapshot]:
+        """The snapshot to search, or None if there is nothing to search yet."""
+        if len(self.metadata) == 0 or self.ensure_index() is None:
+            return None
+        snapshot = self._snapshot
+        if (hybrid and snapshot.keywords is None) or (filtered and snapshot.filter_index is None):
+            # Loaded stores come with both; otherwise they are built by the
+            # first search that needs them and attached to the snapshot they
+            # were built from, so a reload cannot mix generations
+            with self._swap_lock:
+                snapshot = self._snapshot
+                if hybrid and snapshot.keywords is None:
+                    snapshot = snapshot.replace(keywords=KeywordIndex.build(snapshot.metadata.chunks()))
+                if filtered and snapshot.filter_index is None:
+                    snapshot = snapshot.replace(filter_index=FilterIndex.build(snapshot.metadata))
+                self._snapshot = snapshot
+        return snapshot
+
+    def _search_one(
+        self,
+        snapshot: IndexSnapshot,
+        query: str,
+        query_vec: np.ndarray,
+        k: int,
+        min_score: Optional[float],
+        hybrid: bool,
+        filters: Optional[SearchFilters]
+    ) -> List[tuple[ChunkMetadata, float]]:
+        """Search one query that needs its own index.search (hybrid or filtered)."""
+        with stage("filter"):
+            allowed = snapshot.filter_index.matching(filters) if filters is not None else None
+        if allowed is not None and not allowed.any():
+            return []
+        if hybrid:
+            results = self._hybrid_search(snapshot, query, query_vec, k, min_score, allowed)
+        else:
+            params = id_filter_params(snapshot.index, allowed) if allowed is not None else None
+            results = self._search_vectors(snapshot, query_vec, k, [min_score], params)[0]
+        if allowed is not None:
+            # Report the duplicate whose URL passed the filters
+            results = [(snapshot.filter_index.resolve(meta, filters), score) for meta, score in results]
+        return results
+
+    def _prepare_queries(self, snapshot: IndexSnapshot, query_vecs: np.ndarray) -> np.ndarray:
+        query_vecs = np.ascontiguousarray(query_vecs, dtype=np.float32)
+        if snapshot.cosine:
+            query_vecs = normalize_vectors(query_vecs)
+        return query_vecs
+
+    def _search_vectors(
+        self,
+        snapshot: IndexSnapshot,
+        query_vecs: np.ndarray,
+        k: int,
+        min_scores: List[Optional[float]],
+        params=None
+    ) -> List[List[tuple[ChunkMetadata, float]]]:
+        """Run one index.search over a matrix of query vectors."""
+        if not snapshot.cosine and any(score is not None for score in min_scores):
+            logger.warning("min_score requires cosine mode, ignoring it")
+            min_scores = [None] * len(min_scores)
+
+        query_vecs = self._prepare_queries(snapshot, query_vecs)
+        D, I = self._index_search(snapshot, query_vecs, k, params)
+
+        all_results = []
+        for row_ids, row_scores, min_score in zip(I, D, min_scores):
+            results = []
+            for idx, score in zip(row_ids, row_scores):
+                if min_score is not None and score < min_score:
+                    # Results are sorted by similarity, the rest are lower
+                    break
+                if 0 <= idx < len(snapshot.metadata):
+                    results.append((snapshot.metadata[idx], float(score)))
+                    logger.debug("Found match with score %.4f", score)
+            all_results.append(results)
+        return all_results
+
+    def _index_search(self, snapshot: IndexSnapshot, query_vecs: np.ndarray, k: int, params=None):
+        """
+        index.search, re-ranked exactly when the index is approximate.
+
+        With a rerank factor, k * factor candidates are fetched and re-scored
+        against the full-precision vectors, which a served store keeps
+        memory-mapped on disk.
+        """
+        factor = self.rerank_factor
+        if factor is None:
+            factor = snapshot.index_config.rerank_factor
+        vectors = self.vectors(snapshot)
+        with stage("index_search"):
+            if factor <= 1 or vectors is None or flat_vectors(snapshot.index) is not None:
+                return snapshot.index.search(query_vecs, k, params=params)
+            _, candidates = snapshot.index.search(query_vecs, k * factor, params=params)
+        with stage("rerank"):
+            return rerank(vectors, query_vecs, candidates, k, snapshot.cosine)
+
+    def _hybrid_search(
+        self,
+        snapshot: IndexSnapshot,
+        query: str,
+        query_vec: np.ndarray,
+        k: int,
+        min_score: Optional[float],
+        allowed: Optional[np.ndarray] = None
+    ) -> List[tuple[ChunkMetadata, float]]:
+        """
+        Fuse vector and BM25 rankings with reciprocal rank fusion.
+
+        When every query term occurs in only a few chunks (an exact-term
+        lookup such as an error code), only those chunks are scored, straight
+        from the stored vectors instead of searching the index.
+        allowed is a mask of vectors that passed the metadata filters.
+        Returned scores are vector scores, ordered by fused rank.
+        """
+        depth = k * HYBRID_DEPTH_FACTOR
+        query_vec = self._prepare_queries(snapshot, query_vec)
+        with stage("keyword_search"):
+            candidates = snapshot.keywords.matching(query)
+            if allowed is None:
+                lexical_ids, _ = snapshot.keywords.search(query, depth)
+            else:
+                # Rank every keyword match so filtering leaves enough of them
+                lexical_ids, _ = snapshot.keywords.search(query, len(snapshot.metadata))
+                lexical_ids = lexical_ids[allowed[lexical_ids]][:depth]
+                candidates = candidates[allowed[candidates]]
+
+        vectors = self.vectors(snapshot)
+        prefilter = 0 < len(candidates) <= max(depth, self.prefilter_fraction * len(snapshot.metadata))
+        if prefilter and vectors is not None:
+            # Score the few keyword matches from their stored vectors; an ID
+            # selector would still make a flat index visit every vector
+            logger.debug("Scoring %d keyword matches directly", len(candidates))
+            with stage("index_search"):
+                D, I = rerank(vectors, query_vec, candidates[np.newaxis], depth, snapshot.cosine)
+        else:
+            params = None
+            if prefilter:
+                params = id_filter_params(snapshot.index, candidates)
+            elif allowed is not None:
+                params = id_filter_params(snapshot.index, allowed)
+            D, I = self._index_search(snapshot, query_vec, depth, params)
+
+        fused = {}
+        vector_scores = {}
+        for rank, (idx, score) in enumerate(zip(I[0], D[0])):
+            if 0 <= idx < len(snapshot.metadata):
+                fused[idx] = 1.0 / (RRF_K + rank + 1)
+                vector_scores[idx] = float(score)
+        for rank, idx in enumerate(lexical_ids):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        results = []
+        for idx in sorted(fused, key=fused.get, reverse=True):
+            if idx not in vector_scores:
+                # Keyword-only match: score its stored vector directly
+                vector = np.asarray(vectors[idx], dtype=np.float32)
+                if snapshot.cosine:
+                    vector_scores[idx] = float(np.dot(vector, query_vec[0]))
+                else:
+                    vector_scores[idx] = float(np.sum((vector - query_vec[0]) ** 2))
+            score = vector_scores[idx]
+            if min_score is not None and snapshot.cosine and score < min_score:
+                continue
+            results.append((snapshot.metadata[idx], score))
+            if len(results) == k:
+                break
         return results
 
+    def close(self):
+        """Write queued history entries and spill the query cache; call before the process exits."""
+        self.history.close()
+        if self.query_cache is not None:
+            self.query_cache.close()
+
     def get_recent_searches(self, limit: int = 5) -> List[SearchHistory]:
         """Get recent search history."""
-        logger.info(f"Retrieving {limit} recent searches")
-        return sorted(
-            self.search_history,
-            key=lambda x: x.timestamp,
-            reverse=True
-        )[:limit] 
\ No newline at end of file
+        logger.debug("Retrieving %d recent searches", limit)
+        return self.history.recent(limit) 
\ No newline at end of file
@@ -0,0 +1,218 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import numpy as np
+from models import ChunkMetadata, ChunkRef, SearchFilters
+from metadata_table import MetadataTable
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("metadata_filters")
+
+def url_host(url: str) -> str:
+    """Lowercase host of a URL without a leading www."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def _domain_key(domain: str) -> str:
+    """Normalize a domain filter ("GitHub.com", "https://www.github.com/") to a host."""
+    return url_host(domain if "://" in domain else "//" + domain)
+
+def _time_window(filters: SearchFilters):
+    after = filters.visited_after.timestamp() if filters.visited_after else None
+    if filters.visited_within_days:
+        since = time.time() - filters.visited_within_days * 86400
+        after = since if after is None else max(after, since)
+    before = filters.visited_before.timestamp() if filters.visited_before else None
+    return after, before
+
+def ref_matches(ref, filters: SearchFilters) -> bool:
+    """Whether one chunk or duplicate reference passes the filters."""
+    if filters.domains:
+        host = url_host(ref.url)
+        keys = [_domain_key(domain) for domain in filters.domains]
+        if not any(host == key or host.endswith("." + key) for key in keys):
+            return False
+    if filters.url_prefix and not ref.url.startswith(filters.url_prefix):
+        return False
+    after, before = _time_window(filters)
+    if after is not None or before is not None:
+        if ref.visited_at is None:
+            return False
+        if after is not None and ref.visited_at < after:
+            return False
+        if before is not None and ref.visited_at > before:
+            return False
+    return True
+
+class FilterIndex:
+    """
+    Precomputed lookups for filtering searches by URL and visit time.
+
+    Every URL that references a vector (the chunk itself and its
+    duplicates) is one entry. Entries are indexed by host and every parent
+    domain, and kept sorted by URL and by visit time, so each filter is a
+    dictionary lookup or a binary search. matching() turns a filter into a
+    boolean mask over vector ids, which the search hands to FAISS as a
+    bitmap ID selector.
+
+    Stores save the index next to their metadata, so loading a store does
+    not rebuild it.
+    """
+
+    def __init__(self, num_vectors: int, entry_vectors: np.ndarray,
+                 domains: Dict[str, np.ndarray], sorted_url_refs: np.ndarray,
+                 sorted_urls: List[str], url_order: np.ndarray,
+                 sorted_url_ranks: np.ndarray, visit_order: np.ndarray,
+                 sorted_visits: np.ndarray):
+        self.num_vectors = num_vectors
+        self.entry_vectors = entry_vectors
+        self.domains = domains
+        self.sorted_url_refs = sorted_url_refs
+        self.sorted_urls = sorted_urls
+        self.url_order = url_order
+        self.sorted_url_ranks = sorted_url_ranks
+        self.visit_order = visit_order
+        self.sorted_visits = sorted_visits
+
+    @classmethod
+    def build(cls, metadata: MetadataTable) -> "FilterIndex":
+        """Index every URL that references a vector of the metadata."""
+        entry_vectors, url_refs, visits = metadata.references()
+
+        # Hosts and sort order are computed once per distinct URL
+        urls = metadata.urls.strings
+        by_url = np.argsort(url_refs, kind="stable")
+        bounds = np.searchsorted(url_refs[by_url], np.arange(len(urls) + 1))
+        domains: Dict[str, List[np.ndarray]] = {}
+        for url_ref, url in enumerate(urls):
+            entries = by_url[bounds[url_ref]:bounds[url_ref + 1]]
+            if not len(entries):
+                continue
+            labels = url_host(url).split(".")
+            for i in range(len(labels)):
+                domains.setdefault(".".join(labels[i:]), []).append(entries)
+        domains = {key: np.concatenate(entries) for key, entries in domains.items()}
+
+        sorted_refs = np.asarray(sorted(range(len(urls)), key=urls.__getitem__), dtype=np.int64)
+        url_rank = np.empty(len(urls), dtype=np.int64)
+        url_rank[sorted_refs] = np.arange(len(urls))
+        entry_ranks = url_rank[url_refs]
+        url_order = np.argsort(entry_ranks, kind="stable")
+
+        visit_order = np.argsort(visits, kind="stable")
+        logger.info(f"Built filter index over {len(visits)} URLs in {len(domains)} domains")
+        return cls(
+            len(metadata), entry_vectors, domains, sorted_refs,
+            [urls[url_ref] for url_ref in sorted_refs], url_order,
+            entry_ranks[url_order], visit_order, visits[visit_order]
+        )
+
+    def __len__(self) -> int:
+        return self.num_vectors
+
+    def save(self, file):
+        """Write the index as .npz to a path or binary file object; URLs are saved as references."""
+        keys = sorted(self.domains)
+        sizes = [len(self.domains[key]) for key in keys]
+        np.savez(
+            file,
+            num_vectors=np.int64(self.num_vectors),
+            entry_vectors=self.entry_vectors,
+            domain_keys=np.asarray(keys, dtype=str),
+            domain_offsets=np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]),
+            domain_entries=np.concatenate([self.domains[key] for key in keys]) if keys else np.zeros(0, dtype=np.int64),
+            sorted_url_refs=self.sorted_url_refs,
+            url_order=self.url_order,
+            sorted_url_ranks=self.sorted_url_ranks,
+            visit_order=self.visit_order,
+            sorted_visits=self.sorted_visits
+        )
+
+    @classmethod
+    def load(cls, path: str, metadata: MetadataTable) -> "FilterIndex":
+        """Load an index saved for the metadata's URL table."""
+        with np.load(path) as data:
+            offsets = data["domain_offsets"]
+            entries = data["domain_entries"]
+            domains = {
+                key: entries[offsets[i]:offsets[i + 1]]
+                for i, key in enumerate(data["domain_keys"].tolist())
+            }
+            sorted_url_refs = data["sorted_url_refs"]
+            return cls(
+                int(data["num_vectors"]),
+                data["entry_vectors"],
+                domains,
+                sorted_url_refs,
+                [metadata.urls[url_ref] for url_ref in sorted_url_refs.tolist()],
+                data["url_order"],
+                data["sorted_url_ranks"],
+                data["visit_order"],
+                data["sorted_visits"]
+            )
+
+    def _domain_entries(self, domains: List[str]) -> np.ndarray:
+        keys = [_domain_key(domain) for domain in domains]
+        found = [self.domains[key] for key in keys if key in self.domains]
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def _prefix_entries(self, prefix: str) -> np.ndarray:
+        # URLs with the prefix are a run of ranks in the sorted distinct URLs;
+        # every string with this prefix sorts below prefix + U+10FFFF
+        low = bisect_left(self.sorted_urls, prefix)
+        high = bisect_left(self.sorted_urls, prefix + "\U0010ffff", lo=low)
+        start, end = np.searchsorted(self.sorted_url_ranks, [low, high], side="left")
+        return self.url_order[start:end]
+
+    def _visit_entries(self, after: Optional[float], before: Optional[float]) -> np.ndarray:
+        # Entries without a visit time (NO_VISIT_TIME) never pass a time filter
+        start = np.searchsorted(self.sorted_visits, max(after or 0, 0), side="left")
+        end = len(self.sorted_visits) if before is None else np.searchsorted(self.sorted_visits, before, side="right")
+        return self.visit_order[start:end]
+
+    def resolve(self, meta: ChunkMetadata, filters: Optional[SearchFilters]) -> ChunkMetadata:
+        """The chunk, or the duplicate of it, that passed the filters."""
+        if filters is None or filters.is_empty() or not meta.duplicates:
+            return meta
+        for ref in [meta] + list(meta.duplicates):
+            if ref_matches(ref, filters):
+                if ref is meta:
+                    return meta
+                # The chunk that was searched becomes a duplicate of the one shown
+                duplicates = [
+                    ChunkRef(url=meta.url, chunk_id=meta.chunk_id, visited_at=meta.visited_at)
+                ] + [duplicate for duplicate in meta.duplicates if duplicate is not ref]
+                return meta.copy(update={
+                    "url": ref.url,
+                    "chunk_id": ref.chunk_id,
+                    "visited_at": ref.visited_at,
+                    "duplicates": duplicates,
+                })
+        return meta
+
+    def matching(self, filters: Optional[SearchFilters]) -> Optional[np.ndarray]:
+        """Boolean mask of vectors with an entry passing every filter; None if unfiltered."""
+        if filters is None or filters.is_empty():
+            return None
+
+        entries = np.ones(len(self.entry_vectors), dtype=bool)
+
+        def restrict(selected: np.ndarray):
+            mask = np.zeros(len(entries), dtype=bool)
+            mask[selected] = True
+            entries[:] &= mask
+
+        if filters.domains:
+            restrict(self._domain_entries(filters.domains))
+        if filters.url_prefix:
+            restrict(self._prefix_entries(filters.url_prefix))
+
+        after, before = _time_window(filters)
+        if after is not None or before is not None:
+            restrict(self._visit_entries(after, before))
+
+        allowed = np.zeros(self.num_vectors, dtype=bool)
+        allowed[self.entry_vectors[entries]] = True
+        return allowed
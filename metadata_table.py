@@ -0,0 +1,361 @@
+import operator
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from models import ChunkMetadata, ChunkRef
+
+NO_VISIT_TIME = -1  # Sorts before every real visit time
+NO_ORDINAL = -1     # Chunk id that is not "<prefix>_<number>"
+
+def split_chunk_id(chunk_id: str) -> Tuple[str, int]:
+    """Split "page_12" into ("page", 12); ids without a numeric suffix keep ordinal -1."""
+    prefix, sep, number = chunk_id.rpartition("_")
+    # Only split when joining the parts gives back the same id
+    if sep and number.isascii() and number.isdigit() and str(int(number)) == number:
+        ordinal = int(number)
+        if ordinal < 2 ** 31:
+            return prefix, ordinal
+    return chunk_id, NO_ORDINAL
+
+class StringTable:
+    """Interned strings: each distinct string is stored once and referred to by index."""
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = []
+        self._ids: Optional[Dict[str, int]] = {}
+        for string in strings:
+            self.add(string)
+
+    @classmethod
+    def from_distinct(cls, strings: List[str]) -> "StringTable":
+        """Table over strings that are already distinct; the lookup dict is built on first use."""
+        table = cls()
+        table.strings = strings
+        table._ids = None
+        return table
+
+    @property
+    def ids(self) -> Dict[str, int]:
+        if self._ids is None:
+            self._ids = {string: ref for ref, string in enumerate(self.strings)}
+        return self._ids
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getitem__(self, ref: int) -> str:
+        return self.strings[ref]
+
+    def add(self, string: str) -> int:
+        ref = self.ids.get(string)
+        if ref is None:
+            ref = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return ref
+
+# A duplicate reference: (url ref, chunk id prefix ref, ordinal, visit time)
+_Ref = Tuple[int, int, int, int]
+
+# Per-row columns with their array typecodes and dtypes
+_COLUMNS = (
+    ("_url_refs", "i", np.int32),
+    ("_prefix_refs", "i", np.int32),
+    ("_ordinals", "i", np.int32),
+    ("_visits", "q", np.int64),
+    ("_offsets", "q", np.int64),
+)
+
+class MetadataTable:
+    """
+    Chunk metadata stored column by column.
+
+    URLs and chunk id prefixes are interned, so a URL repeated by every
+    chunk of a page is stored once and each row holds an integer
+    reference. A chunk id "page_12" is stored as the interned prefix "page"
+    and the integer 12. Chunk text is kept in one UTF-8 buffer addressed by
+    offsets. Indexing a row builds its ChunkMetadata on demand, so a search
+    only creates objects for the results it returns.
+
+    Duplicate references are rare and kept in a dictionary by row.
+
+    columns() and from_columns() convert to and from plain numpy arrays, so
+    a store can save the columns as .npy files and map them read-only on
+    load. A table over mapped columns copies them into growable arrays the
+    first time a row is added or changed.
+    """
+
+    def __init__(self, metadata: Iterable[ChunkMetadata] = ()):
+        self.urls = StringTable()
+        self.prefixes = StringTable()
+        self._url_refs = array("i")
+        self._prefix_refs = array("i")
+        self._ordinals = array("i")
+        self._visits = array("q")
+        self._text = bytearray()
+        self._offsets = array("q", [0])
+        self._duplicates: Dict[int, List[_Ref]] = {}
+        self.extend(metadata)
+
+    def __len__(self) -> int:
+        return len(self._url_refs)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Every column as a numpy array (views where possible), for saving."""
+        columns = {
+            name.lstrip("_"): np.frombuffer(getattr(self, name), dtype=dtype)
+            for name, _, dtype in _COLUMNS
+        }
+        columns["text"] = np.frombuffer(self._text, dtype=np.uint8)
+        duplicates = [
+            (row,) + tuple(ref)
+            for row, refs in sorted(self._duplicates.items()) for ref in refs
+        ]
+        columns["duplicates"] = np.asarray(duplicates, dtype=np.int64).reshape(-1, 5)
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray], urls: List[str], prefixes: List[str]) -> "MetadataTable":
+        """
+        Table over arrays saved by columns().
+
+        The arrays are used as they are, so memory-mapped columns are not
+        read until rows are accessed.
+        """
+        table = cls()
+        table.urls = StringTable.from_distinct(urls)
+        table.prefixes = StringTable.from_distinct(prefixes)
+        for name, _, _ in _COLUMNS:
+            setattr(table, name, columns[name.lstrip("_")])
+        table._text = columns["text"]
+        for row, *ref in columns["duplicates"].tolist():
+            table._duplicates.setdefault(row, []).append(tuple(ref))
+        return table
+
+    def _make_writable(self):
+        """Copy columns loaded by from_columns into growable arrays."""
+        if isinstance(self._text, bytearray):
+            return
+        for name, typecode, _ in _COLUMNS:
+            setattr(self, name, array(typecode, np.asarray(getattr(self, name)).tobytes()))
+        self._text = bytearray(self._text)
+
+    def __getitem__(self, row) -> ChunkMetadata:
+        row = operator.index(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("metadata row out of range")
+        visited_at = int(self._visits[row])
+        return ChunkMetadata(
+            url=self.urls[self._url_refs[row]],
+            chunk=self.chunk(row),
+            chunk_id=self.chunk_id(row),
+            visited_at=None if visited_at == NO_VISIT_TIME else visited_at,
+            duplicates=[self._decode_ref(ref) for ref in self._duplicates.get(row, ())]
+        )
+
+    def __iter__(self) -> Iterator[ChunkMetadata]:
+        for row in range(len(self)):
+            yield self[row]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the columns, excluding the interned string tables."""
+        columns = (self._url_refs, self._prefix_refs, self._ordinals, self._visits, self._offsets)
+        return len(self._text) + sum(column.itemsize * len(column) for column in columns)
+
+    def _chunk_id(self, prefix_ref: int, ordinal: int) -> str:
+        prefix = self.prefixes[prefix_ref]
+        return prefix if ordinal == NO_ORDINAL else f"{prefix}_{ordinal}"
+
+    def _encode_ref(self, url: str, chunk_id: str, visited_at: Optional[int]) -> _Ref:
+        prefix, ordinal = split_chunk_id(chunk_id)
+        return (
+            self.urls.add(url),
+            self.prefixes.add(prefix),
+            ordinal,
+            NO_VISIT_TIME if visited_at is None else visited_at
+        )
+
+    def _decode_ref(self, ref: _Ref) -> ChunkRef:
+        url_ref, prefix_ref, ordinal, visited_at = ref
+        return ChunkRef(
+            url=self.urls[url_ref],
+            chunk_id=self._chunk_id(prefix_ref, ordinal),
+            visited_at=None if visited_at == NO_VISIT_TIME else visited_at
+        )
+
+    def _set_row(self, row: int, ref: _Ref):
+        self._make_writable()
+        self._url_refs[row], self._prefix_refs[row], self._ordinals[row], self._visits[row] = ref
+
+    def chunk(self, row: int) -> str:
+        return str(memoryview(self._text)[self._offsets[row]:self._offsets[row + 1]], "utf-8")
+
+    def chunk_id(self, row: int) -> str:
+        return self._chunk_id(int(self._prefix_refs[row]), int(self._ordinals[row]))
+
+    def chunks(self) -> Iterator[str]:
+        """Chunk text of every row, without building ChunkMetadata."""
+        for row in range(len(self)):
+            yield self.chunk(row)
+
+    def chunk_ids(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self.chunk_id(row)
+
+    def append(self, meta: ChunkMetadata):
+        self.append_row(meta.url, meta.chunk, meta.chunk_id, meta.visited_at,
+                        [(ref.url, ref.chunk_id, ref.visited_at) for ref in meta.duplicates])
+
+    def append_row(self, url: str, chunk: str, chunk_id: str,
+                   visited_at: Optional[int] = None,
+                   duplicates: Iterable[Tuple[str, str, Optional[int]]] = ()):
+        """Append a row from plain values; duplicates are (url, chunk_id, visited_at)."""
+        self._make_writable()
+        row = len(self)
+        url_ref, prefix_ref, ordinal, visit = self._encode_ref(url, chunk_id, visited_at)
+        self._url_refs.append(url_ref)
+        self._prefix_refs.append(prefix_ref)
+        self._ordinals.append(ordinal)
+        self._visits.append(visit)
+        self._text += chunk.encode("utf-8")
+        self._offsets.append(len(self._text))
+        refs = [self._encode_ref(*duplicate) for duplicate in duplicates]
+        if refs:
+            self._duplicates[row] = refs
+
+    def extend(self, metadata: Iterable[ChunkMetadata]):
+        for meta in metadata:
+            self.append(meta)
+
+    def rows(self) -> Iterator[Tuple[str, str, str, Optional[int], List[Tuple[str, str, Optional[int]]]]]:
+        """Every row as plain (url, chunk, chunk_id, visited_at, duplicates) values."""
+        for row in range(len(self)):
+            visited_at = int(self._visits[row])
+            duplicates = []
+            for ref in self._duplicates.get(row, ()):
+                duplicate = self._decode_ref(ref)
+                duplicates.append((duplicate.url, duplicate.chunk_id, duplicate.visited_at))
+            yield (
+                self.urls[self._url_refs[row]],
+                self.chunk(row),
+                self.chunk_id(row),
+                None if visited_at == NO_VISIT_TIME else visited_at,
+                duplicates
+            )
+
+    def references(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every URL that refers to a vector: each row and each of its duplicates.
+
+        Returns parallel arrays of row, URL reference and visit time
+        (NO_VISIT_TIME if unknown).
+        """
+        rows = np.arange(len(self), dtype=np.int64)
+        url_refs = np.frombuffer(self._url_refs, dtype=np.int32).astype(np.int64)
+        visits = np.frombuffer(self._visits, dtype=np.int64).copy()
+        if not self._duplicates:
+            return rows, url_refs, visits
+        extra = [(row, ref[0], ref[3]) for row, refs in self._duplicates.items() for ref in refs]
+        extra = np.asarray(extra, dtype=np.int64)
+        return (
+            np.concatenate([rows, extra[:, 0]]),
+            np.concatenate([url_refs, extra[:, 1]]),
+            np.concatenate([visits, extra[:, 2]])
+        )
+
+    def _row_keys(self) -> np.ndarray:
+        """One int64 per row identifying its chunk id."""
+        prefixes = np.frombuffer(self._prefix_refs, dtype=np.int32).astype(np.int64)
+        ordinals = np.frombuffer(self._ordinals, dtype=np.int32).astype(np.int64)
+        return (prefixes << 32) | (ordinals & 0xFFFFFFFF)
+
+    def _id_keys(self, chunk_ids: Iterable[str]) -> np.ndarray:
+        keys = []
+        for chunk_id in chunk_ids:
+            prefix, ordinal = split_chunk_id(chunk_id)
+            prefix_ref = self.prefixes.ids.get(prefix)
+            if prefix_ref is not None:
+                keys.append((prefix_ref << 32) | (ordinal & 0xFFFFFFFF))
+        return np.asarray(keys, dtype=np.int64)
+
+    def find(self, chunk_ids: Iterable[str]) -> Dict[str, int]:
+        """Rows of the given chunk ids that are present."""
+        wanted = self._id_keys(chunk_ids)
+        rows = np.flatnonzero(np.isin(self._row_keys(), wanted))
+        return {self.chunk_id(row): int(row) for row in rows}
+
+    def add_duplicates(self, references: List[Tuple[str, ChunkRef]]) -> int:
+        """
+        Record duplicates given as (representative chunk id, reference).
+
+        Returns the number of references whose representative was not found.
+        """
+        rows = self.find({chunk_id for chunk_id, _ in references})
+        missing = 0
+        for chunk_id, ref in references:
+            row = rows.get(chunk_id)
+            if row is None:
+                missing += 1
+                continue
+            self._duplicates.setdefault(row, []).append(
+                self._encode_ref(ref.url, ref.chunk_id, ref.visited_at)
+            )
+        return missing
+
+    def remove(self, chunk_ids: Iterable[str]) -> List[int]:
+        """
+        Drop chunk ids from rows and duplicate references.
+
+        A row whose chunk is dropped but that still has duplicates is taken
+        over by the first remaining one. Returns the rows left with no
+        chunk, which the caller removes with select().
+        """
+        drop = set(chunk_ids)
+        for row in list(self._duplicates):
+            refs = [
+                ref for ref in self._duplicates[row]
+                if self._chunk_id(ref[1], ref[2]) not in drop
+            ]
+            if refs:
+                self._duplicates[row] = refs
+            else:
+                del self._duplicates[row]
+
+        empty = []
+        for row in np.flatnonzero(np.isin(self._row_keys(), self._id_keys(drop))):
+            row = int(row)
+            refs = self._duplicates.get(row)
+            if refs:
+                # The first remaining duplicate takes over the vector
+                self._set_row(row, refs.pop(0))
+                if not refs:
+                    del self._duplicates[row]
+            else:
+                empty.append(row)
+        return empty
+
+    def select(self, keep: np.ndarray) -> "MetadataTable":
+        """New table with the rows where keep is True; the string tables are shared."""
+        rows = np.flatnonzero(keep)
+        table = MetadataTable()
+        table.urls, table.prefixes = self.urls, self.prefixes
+        for name, dtype in (("_url_refs", np.int32), ("_prefix_refs", np.int32),
+                            ("_ordinals", np.int32), ("_visits", np.int64)):
+            column = np.frombuffer(getattr(self, name), dtype=dtype)[rows]
+            getattr(table, name).frombytes(column.tobytes())
+
+        offsets = np.frombuffer(self._offsets, dtype=np.int64)
+        starts, ends = offsets[rows], offsets[rows + 1]
+        text = memoryview(self._text)
+        table._text = bytearray(b"".join(text[start:end] for start, end in zip(starts, ends)))
+        table._offsets.frombytes(np.cumsum(ends - starts, dtype=np.int64).tobytes())
+
+        new_rows = np.full(len(self), -1, dtype=np.int64)
+        new_rows[rows] = np.arange(len(rows))
+        table._duplicates = {
+            int(new_rows[row]): list(refs)
+            for row, refs in self._duplicates.items() if new_rows[row] >= 0
+        }
+        return table
@@ -0,0 +1,144 @@
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+class Histogram:
+    """Counts of observations per bucket, with their sum, Prometheus style."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Cumulative bucket counts, sum and count."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class HistogramFamily:
+    """Histograms of one metric, one per value of a single label."""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def child(self, value: str) -> Histogram:
+        histogram = self.children.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = self.children.setdefault(value, Histogram())
+        return histogram
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, histogram in sorted(self.children.items()):
+            counts, total, count = histogram.snapshot()
+            label = f'{self.label}="{value}"'
+            for bound, cumulative in zip(histogram.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {counts[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Timing histograms for the search pipeline and values read on scrape.
+
+    While disabled, stage() returns a shared no-op context manager, so
+    instrumented code pays one attribute check per stage.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = HistogramFamily(
+            "rag_stage_seconds", "Time spent in each search pipeline stage", "stage"
+        )
+        self.requests = HistogramFamily(
+            "rag_request_seconds", "Time to serve each API endpoint", "endpoint"
+        )
+        # name -> (type, help, callback returning the value or None)
+        self._callbacks: Dict[str, Tuple[str, str, Callable[[], Optional[float]]]] = {}
+
+    def stage(self, name: str):
+        """Context manager timing one pipeline stage."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.stages.child(name))
+
+    def observe_request(self, endpoint: str, seconds: float):
+        if self.enabled:
+            self.requests.child(endpoint).observe(seconds)
+
+    def register(self, name: str, kind: str, help_text: str, callback: Callable[[], Optional[float]]):
+        """Add a gauge or counter whose value is read when metrics are rendered."""
+        self._callbacks[name] = (kind, help_text, callback)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = self.stages.render() + self.requests.render()
+        for name, (kind, help_text, callback) in sorted(self._callbacks.items()):
+            try:
+                value = callback()
+            except Exception:
+                value = None
+            if value is None:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry used by the instrumented modules
+registry = MetricsRegistry()
+
+def stage(name: str):
+    """Time a pipeline stage in the process-wide registry."""
+    return registry.stage(name)
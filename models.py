@@ -2,20 +2,46 @@ from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
+class ChunkRef(BaseModel):
+    url: str
+    chunk_id: str
+    visited_at: Optional[int] = None
+
 class ChunkMetadata(BaseModel):
     url: str
     chunk: str
     chunk_id: str
+    # Unix time the page was visited, if known
+    visited_at: Optional[int] = None
+    # Duplicate chunks that share this chunk's vector
+    duplicates: List[ChunkRef] = []
 
 class SearchResult(BaseModel):
     url: str
     content: str
     similarity_score: float
 
+class SearchFilters(BaseModel):
+    # Hosts to search; "github.com" also matches its subdomains
+    domains: List[str] = []
+    url_prefix: Optional[str] = None
+    visited_after: Optional[datetime] = None
+    visited_before: Optional[datetime] = None
+    visited_within_days: Optional[float] = None
+
+    def is_empty(self) -> bool:
+        return not (
+            self.domains or self.url_prefix or self.visited_after
+            or self.visited_before or self.visited_within_days
+        )
+
 class SearchQuery(BaseModel):
     query_text: str
     timestamp: datetime = datetime.now()
     num_results: int = 3
+    min_score: Optional[float] = None
+    hybrid: bool = False
+    filters: Optional[SearchFilters] = None
 
 class SearchHistory(BaseModel):
     query: str
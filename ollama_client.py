@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("ollama_client")
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_EMBED_MODEL = "nomic-embed-text"
+
+class OllamaEmbeddingClient:
+    """
+    Pooled, concurrent client for the Ollama embedding API.
+
+    Requests share one keep-alive session whose connection pool is sized to
+    max_concurrency. Failed requests are retried with exponential backoff.
+    Batches go to /api/embed, which accepts a list of inputs; servers that
+    only expose /api/embeddings (one prompt per call) are detected on the
+    first batch and served with concurrent single requests instead.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        model: str = OLLAMA_EMBED_MODEL,
+        max_concurrency: int = 8,
+        batch_size: int = 32,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="ollama"
+        )
+        self._supports_batch: Optional[bool] = None
+
+        # Throughput counters
+        self._stats_lock = threading.Lock()
+        self.texts_embedded = 0
+        self.requests_sent = 0
+        self.retries = 0
+        self.busy_seconds = 0.0
+
+    def _post(self, path: str, payload: dict) -> dict:
+        """POST with retry and exponential backoff on connection and 5xx errors."""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                with self._stats_lock:
+                    self.requests_sent += 1
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(f"{response.status_code} from {url}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            with self._stats_lock:
+                self.retries += 1
+            delay = self.backoff * (2 ** attempt)
+            logger.warning(f"Embedding request failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text with /api/embeddings."""
+        data = self._post("/api/embeddings", {"model": self.model, "prompt": text})
+        with self._stats_lock:
+            self.texts_embedded += 1
+        return np.array(data["embedding"], dtype=np.float32)
+
+    def _embed_batch_request(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch, using /api/embed when the server supports it."""
+        if self._supports_batch is not False:
+            try:
+                data = self._post("/api/embed", {"model": self.model, "input": texts})
+                self._supports_batch = True
+                with self._stats_lock:
+                    self.texts_embedded += len(texts)
+                return np.array(data["embeddings"], dtype=np.float32)
+            except requests.HTTPError as e:
+                if self._supports_batch or e.response is None or e.response.status_code != 404:
+                    raise
+                logger.info("Server has no /api/embed, falling back to /api/embeddings")
+                self._supports_batch = False
+        return np.stack([self.embed(text) for text in texts])
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed many texts, with up to max_concurrency requests in flight.
+
+        Returns a float32 (len(texts), dimension) matrix in input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        if self._supports_batch is None:
+            # Probe the batch endpoint once before fanning out
+            first = self._embed_batch_request(texts[:self.batch_size])
+            rest = texts[self.batch_size:]
+            results = [first]
+        else:
+            rest = texts
+            results = []
+
+        if self._supports_batch:
+            batches = [rest[i:i + self.batch_size] for i in range(0, len(rest), self.batch_size)]
+            results.extend(self._executor.map(self._embed_batch_request, batches))
+        elif rest:
+            results.append(np.stack(list(self._executor.map(self.embed, rest))))
+
+        with self._stats_lock:
+            self.busy_seconds += time.perf_counter() - start
+        return np.vstack(results)
+
+    def throughput_report(self) -> dict:
+        """Texts embedded, requests sent and texts/sec while embedding."""
+        with self._stats_lock:
+            return {
+                "texts_embedded": self.texts_embedded,
+                "requests_sent": self.requests_sent,
+                "retries": self.retries,
+                "busy_seconds": self.busy_seconds,
+                "texts_per_second": (
+                    self.texts_embedded / self.busy_seconds if self.busy_seconds else 0.0
+                ),
+            }
+
+    def close(self):
+        """Shut down the worker threads and the HTTP session."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
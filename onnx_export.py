@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import argparse
+from typing import List, Optional
+import numpy as np
+from embedding_backends import (
+    DEFAULT_MODEL_NAME,
+    DEFAULT_ONNX_DIR,
+    ONNX_CONFIG_FILE,
+    EmbeddingBackend,
+    OnnxBackend,
+    SentenceTransformerBackend
+)
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("onnx_export")
+
+OPSET_VERSION = 14
+MIN_COSINE = 0.99  # Lowest per-text cosine agreement accepted by the parity check
+
+# Short queries like the ones the server embeds; store chunks are added when available
+PARITY_TEXTS = [
+    "python tutorial",
+    "how to reverse a linked list",
+    "best pizza near me",
+    "faiss index types comparison",
+    "what did I read about kubernetes autoscaling",
+    "flask cors setup",
+    "climate change news",
+    "docker compose environment variables",
+    "recipe for banana bread",
+    "numpy broadcasting rules",
+    "rust borrow checker explained",
+    "machine learning interview questions",
+]
+
+def _size_mb(model_path: str) -> float:
+    """Size of an ONNX graph including weights saved as external data."""
+    paths = [model_path, model_path + ".data"]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path)) / 2**20
+
+def export_model(model_name: str, output_dir: str, quantize: bool = True, per_channel: bool = False):
+    """
+    Export a sentence-transformers model's encoder to ONNX.
+
+    Writes model.onnx, model_int8.onnx (dynamic int8 quantization of the
+    weights) when quantize is set, tokenizer.json and encoder.json with the
+    pooling settings OnnxBackend needs. Needs torch, onnx and onnxruntime.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    encoder = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    encoded = tokenizer(["export sample text"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in encoded]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    start = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(encoded[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+            do_constant_folding=True
+        )
+    logger.info(f"Exported {model_name} to {model_path} in {time.perf_counter() - start:.1f}s")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(output_dir, "model_int8.onnx")
+        quantize_dynamic(
+            model_path,
+            quantized_path,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel
+        )
+        logger.info(
+            f"Quantized to {quantized_path} "
+            f"({_size_mb(model_path):.0f} MB -> {_size_mb(quantized_path):.0f} MB)"
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    pooling = model[1]
+    config = {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pooling": "cls" if getattr(pooling, "pooling_mode_cls_token", False) else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "opset": OPSET_VERSION,
+        "parity": {},
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+def _encode_ms(backend: EmbeddingBackend, texts: List[str]) -> float:
+    """Mean milliseconds to embed one text, as the server does per query."""
+    backend.embed(texts[0])
+    start = time.perf_counter()
+    for text in texts:
+        backend.embed(text)
+    return (time.perf_counter() - start) / len(texts) * 1000
+
+def parity_check(candidate: EmbeddingBackend, reference: EmbeddingBackend, texts: List[str]) -> dict:
+    """
+    Cosine agreement of candidate's embeddings with reference's for texts.
+
+    Also times single-text encodes of both, the cost a query pays.
+    """
+    ours = candidate.embed_many(texts)
+    theirs = reference.embed_many(texts)
+    ours = ours / np.maximum(np.linalg.norm(ours, axis=1, keepdims=True), 1e-12)
+    theirs = theirs / np.maximum(np.linalg.norm(theirs, axis=1, keepdims=True), 1e-12)
+    cosines = (ours * theirs).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "encode_ms": _encode_ms(candidate, PARITY_TEXTS),
+        "reference_encode_ms": _encode_ms(reference, PARITY_TEXTS),
+    }
+
+def check_exported(output_dir: str, store_dir: Optional[str] = None, sample: int = 500,
+                   threads: int = 0, min_cosine: float = MIN_COSINE) -> bool:
+    """
+    Run the parity check on every graph in output_dir against the PyTorch model.
+
+    Results are recorded in encoder.json, where OnnxBackend reports them on
+    load. Returns whether every graph reached min_cosine on every text.
+    """
+    config_path = os.path.join(output_dir, ONNX_CONFIG_FILE)
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    texts = list(PARITY_TEXTS)
+    if store_dir:
+        from embedding_store import load_store
+
+        metadata = load_store(store_dir).metadata
+        rows = np.random.default_rng(0).permutation(len(metadata))[:sample]
+        texts += [metadata.chunk(int(row)) for row in rows]
+
+    reference = SentenceTransformerBackend(config["model_name"])
+    passed = True
+    for model_file, quantized in (("model.onnx", False), ("model_int8.onnx", True)):
+        if not os.path.exists(os.path.join(output_dir, model_file)):
+            continue
+        candidate = OnnxBackend(output_dir, quantized=quantized, intra_op_threads=threads)
+        result = parity_check(candidate, reference, texts)
+        result["threads"] = threads
+        config["parity"][model_file] = result
+        ok = result["min_cosine"] >= min_cosine
+        passed = passed and ok
+        print(
+            f"{model_file:<16} mean cosine {result['mean_cosine']:.4f}  min {result['min_cosine']:.4f}  "
+            f"encode {result['encode_ms']:.2f} ms vs {result['reference_encode_ms']:.2f} ms  "
+            f"{'ok' if ok else 'FAILED'}"
+        )
+
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return passed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a sentence-transformers model to ONNX and check it against the PyTorch path"
+    )
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--output", default=DEFAULT_ONNX_DIR, help="Directory for the exported model")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 graph")
+    parser.add_argument("--per-channel", action="store_true",
+                        help="Quantize weights per channel (more accurate on some CPUs, slower on others)")
+    parser.add_argument("--check", action="store_true",
+                        help="Only run the parity check on an existing export")
+    parser.add_argument("--store", help="Also compare embeddings of chunks sampled from this store")
+    parser.add_argument("--sample", type=int, default=500, help="Chunks sampled from --store")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    args = parser.parse_args()
+
+    if not args.check:
+        export_model(args.model, args.output, quantize=not args.no_quantize, per_channel=args.per_channel)
+    if not check_exported(args.output, args.store, args.sample, args.threads, args.min_cosine):
+        logger.error(f"Exported model disagrees with {args.model} beyond cosine {args.min_cosine}")
+        sys.exit(1)
@@ -17,7 +17,7 @@ def extract_perception(query: str) -> SearchIntent:
     - Regular search queries
     - History requests (if query contains 'history' or 'recent')
     """
-    logger.info(f"Extracting intent from query: {query}")
+    logger.debug("Extracting intent from query: %s", query)
     query = query.lower().strip()
     
     # Check if it's a history request
@@ -32,5 +32,5 @@ def extract_perception(query: str) -> SearchIntent:
         num_results=num_results
     )
     
-    logger.info(f"Extracted intent: {intent.dict()}")
+    logger.debug("Extracted intent: %r", intent)
     return intent 
\ No newline at end of file
@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import numpy as np
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("query_cache")
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+def normalize_query(text: str) -> str:
+    """Normalize query text for cache lookups (case and whitespace)."""
+    return " ".join(text.lower().split())
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe cache of query embeddings.
+
+    Entries are keyed on normalized query text plus model name. With a
+    spill_path, evicted entries (and all entries on close) are written to a
+    SQLite file that is consulted on in-memory misses, so the cache survives
+    server restarts. Evictions are written in batches by a background thread
+    and spill file reads happen outside the cache lock, so requests never
+    wait on SQLite while holding it.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        policy: str = "lru",
+        spill_path: Optional[str] = None
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.spill_path = spill_path
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Evicted entries waiting for the spill thread
+        self._pending: Dict[str, np.ndarray] = {}
+        self._spill_wanted = threading.Event()
+        self._spill_thread: Optional[threading.Thread] = None
+        # Serializes use of the SQLite connection; never taken with _lock held
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._db = None
+        if spill_path:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            # Readers do not block on the writer of another server process
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+            self._spill_thread = threading.Thread(target=self._spill_loop, name="query-cache-spill", daemon=True)
+            self._spill_thread.start()
+            logger.info(f"Query cache spilling to {spill_path}")
+
+    @staticmethod
+    def make_key(text: str, model_name: str) -> str:
+        return f"{model_name}\x00{normalize_query(text)}"
+
+    def get(self, text: str, model_name: str) -> Optional[np.ndarray]:
+        """Return the cached embedding, or None on a miss."""
+        key = self.make_key(text, model_name)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                if self.policy == "lru":
+                    self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            embedding = self._pending.get(key)
+
+        if embedding is None:
+            embedding = self._read_spill(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, embedding)
+            return embedding
+
+    def put(self, text: str, model_name: str, embedding: np.ndarray):
+        """Add an embedding to the cache, evicting if it is full."""
+        key = self.make_key(text, model_name)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        with self._lock:
+            self._insert(key, embedding)
+
+    def get_or_compute(
+        self,
+        text: str,
+        model_name: str,
+        compute: Callable[[str], np.ndarray]
+    ) -> np.ndarray:
+        """Return the cached embedding or compute and cache it."""
+        embedding = self.get(text, model_name)
+        if embedding is None:
+            embedding = compute(text)
+            self.put(text, model_name, embedding)
+        return embedding
+
+    def _insert(self, key: str, embedding: np.ndarray):
+        self._entries[key] = embedding
+        if self.policy == "lru":
+            self._entries.move_to_end(key)
+        self._pending.pop(key, None)
+        while len(self._entries) > self.max_size:
+            old_key, old_embedding = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self._db is not None:
+                self._pending[old_key] = old_embedding
+                self._spill_wanted.set()
+
+    def _read_spill(self, key: str) -> Optional[np.ndarray]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not read spilled query embeddings: {str(e)}")
+                return None
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _spill_loop(self):
+        while True:
+            self._spill_wanted.wait()
+            self._spill_wanted.clear()
+            if self._db is None:
+                return
+            with self._lock:
+                items = list(self._pending.items())
+            self._write_spill(items)
+            with self._lock:
+                # Entries evicted again or re-inserted meanwhile stay pending
+                for key, embedding in items:
+                    if self._pending.get(key) is embedding:
+                        del self._pending[key]
+
+    def _write_spill(self, items):
+        if not items:
+            return
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, embedding.tobytes()) for key, embedding in items]
+                )
+                self._db.commit()
+            except sqlite3.OperationalError as e:
+                # Another server process holds the write lock; the entry is only a cache
+                logger.warning(f"Could not spill query embeddings: {str(e)}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop all in-memory entries (the spill file is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        """Spill all pending and in-memory entries and close the spill file."""
+        if self._db is None:
+            return
+        with self._lock:
+            items = list(self._pending.items()) + list(self._entries.items())
+            self._pending.clear()
+        self._write_spill(items)
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.close()
+            self._db = None
+        # Wake the spill thread so it sees the closed file and exits
+        self._spill_wanted.set()
+        logger.info("Query cache spilled to disk")
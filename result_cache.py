@@ -0,0 +1,131 @@
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from models import SearchFilters
+from query_cache import normalize_query
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("result_cache")
+
+class SearchResultCache:
+    """
+    Bounded, thread-safe cache of finished search results.
+
+    Entries are keyed on the normalized query text, score cutoff, hybrid
+    flag and filters of the request, and tagged with the generation of the
+    store that produced them. The first lookup for a new generation empties
+    the cache, so a reloaded or rebuilt index never serves old results.
+    Entries expire after ttl_seconds. Least recently used entries are evicted
+    once the cache holds max_entries entries or max_bytes of values.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 16 * 2**20, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry time, value, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._generation: Optional[str] = None
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query_text: str, min_score: Optional[float], hybrid: bool,
+                 filters: Optional[SearchFilters]) -> str:
+        """
+        Key for a search request, built from the request itself.
+
+        The result count is not part of the key: it is derived from the query
+        text, so equal text always asks for the same count.
+        """
+        filters = filters.dict() if filters is not None and not filters.is_empty() else None
+        return "\x00".join([
+            normalize_query(query_text),
+            str(min_score),
+            str(hybrid),
+            json.dumps(filters, sort_keys=True, default=str),
+        ])
+
+    def _check_generation(self, generation: Optional[str]):
+        if generation != self._generation:
+            if self._entries:
+                logger.info(f"Store generation changed to {generation}, dropping {len(self._entries)} cached results")
+                self.invalidations += 1
+            self._entries.clear()
+            self.nbytes = 0
+            self._generation = generation
+
+    def get(self, key: str, generation: Optional[str]) -> Optional[Any]:
+        """Return the cached value for key on this generation, or None on a miss."""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, generation: Optional[str], value: Any, size: Optional[int] = None):
+        """
+        Cache the value for key on this generation.
+
+        size is the value's memory in bytes, for values whose sys.getsizeof
+        does not count what they reference.
+        """
+        size = (size if size is not None else sys.getsizeof(value)) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                old_key = next(iter(self._entries))
+                self._remove(old_key)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.nbytes -= size
+
+    def stats(self) -> dict:
+        """Hit/miss counters, size and memory use."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,122 @@
+import time
+import queue
+import threading
+from typing import List, Optional
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("search_coalescer")
+
+class _PendingSearch:
+    """A caller waiting for its share of a coalesced batch."""
+
+    __slots__ = ("query", "k", "min_score", "enqueued_at", "done", "results", "error")
+
+    def __init__(self, query: str, k: int, min_score: Optional[float]):
+        self.query = query
+        self.k = k
+        self.min_score = min_score
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+class SearchCoalescer:
+    """
+    Micro-batches concurrent searches into MemoryManager.search_batch calls.
+
+    A single dispatcher thread takes the first waiting request plus
+    everything queued behind it, up to max_batch_size. When the server is
+    busy (the last batch held more than one request) it also waits up to
+    window_ms for more requests. An idle server dispatches a lone request
+    immediately, so coalescing adds no latency when there is no load.
+    """
+
+    def __init__(self, memory, window_ms: float = 2.0, max_batch_size: int = 32):
+        self.memory = memory
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue[_PendingSearch]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._busy = False
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.total_wait_seconds = 0.0
+        self.batch_size_counts = {}
+        self._dispatcher = threading.Thread(
+            target=self._run, name="search-coalescer", daemon=True
+        )
+        self._dispatcher.start()
+        logger.info(
+            f"Coalescing searches with a {window_ms}ms window and batches of up to {max_batch_size}"
+        )
+
+    def search(self, query: str, k: int = 3, min_score: Optional[float] = None):
+        """Queue a search and block until its batch has run."""
+        pending = _PendingSearch(query, k, min_score)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def _collect(self) -> List[_PendingSearch]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window if self._busy else None
+        while len(batch) < self.max_batch_size:
+            try:
+                if deadline is None:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.memory.search_batch(
+                    [pending.query for pending in batch],
+                    ks=[pending.k for pending in batch],
+                    min_scores=[pending.min_score for pending in batch]
+                )
+                for pending, rows in zip(batch, results):
+                    pending.results = rows
+            except Exception as e:
+                logger.error(f"Error running coalesced batch: {str(e)}")
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+            self._busy = len(batch) > 1 or not self._queue.empty()
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.total_wait_seconds += sum(started - p.enqueued_at for p in batch)
+                self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+    def stats(self) -> dict:
+        """Window, batch size and queueing metrics."""
+        with self._stats_lock:
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+                "mean_wait_ms": (
+                    self.total_wait_seconds / self.requests * 1000.0 if self.requests else 0.0
+                ),
+                "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+                "queue_depth": self._queue.qsize(),
+            }
@@ -0,0 +1,197 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import threading
+import argparse
+from werkzeug.serving import make_server
+import api_server
+from embedding_store import DEFAULT_STORE_DIR, load_new_generation
+from logger_config import setup_logger, flush_logs
+
+# Set up logger
+logger = setup_logger("serve")
+
+def run_worker(sock: socket.socket, worker_id: int, store):
+    """
+    Serve requests on the shared listening socket until terminated.
+
+    SIGTERM stops accepting connections and returns once the requests in
+    flight have been answered.
+    """
+    server = None
+
+    def stop(*_):
+        if server is None:
+            sys.exit(0)
+        # shutdown() waits for serve_forever to return, so it cannot run on
+        # the main thread, which the signal interrupted inside serve_forever
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # The model is loaded per worker; the store is inherited from the parent,
+    # which also reloads it
+    api_server.initialize_memory(store, parent=os.getppid())
+    server = make_server(
+        sock.getsockname()[0],
+        sock.getsockname()[1],
+        api_server.app,
+        threaded=True,
+        fd=sock.fileno()
+    )
+    # Track handler threads so server_close waits for them
+    server.daemon_threads = False
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) serving")
+    server.serve_forever()
+    server.server_close()
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) stopped")
+
+def spawn_worker(sock: socket.socket, worker_id: int, store) -> int:
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            run_worker(sock, worker_id, store)
+            status = 0
+        except SystemExit:
+            # Terminated before the server started
+            status = 0
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed: {str(e)}")
+        finally:
+            # os._exit skips atexit, so flush history and the query cache here
+            try:
+                api_server.shutdown()
+            except Exception as e:
+                logger.error(f"Worker {worker_id} shutdown failed: {str(e)}")
+            flush_logs()
+            os._exit(status)
+    return pid
+
+def reload_shared_store(store):
+    """Load the store on disk if it is a new generation; None otherwise or on failure."""
+    try:
+        new_store = load_new_generation(DEFAULT_STORE_DIR, store.info.get("generation"))
+    except Exception as e:
+        # A store still being written is retried on the next check
+        logger.error(f"Error reloading store from {DEFAULT_STORE_DIR}: {str(e)}")
+        return None
+    if new_store is not None:
+        logger.info(f"Loaded store generation {new_store.info.get('generation')} ({len(new_store.metadata)} chunks)")
+    return new_store
+
+def replace_workers(sock: socket.socket, children: dict, store):
+    """
+    Restart the workers one at a time on a newly loaded store.
+
+    Each replacement is forked before its predecessor is stopped, so the
+    socket always has workers accepting connections.
+    """
+    for pid, worker_id in list(children.items()):
+        children[spawn_worker(sock, worker_id, store)] = worker_id
+        del children[pid]
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+    logger.info(f"Replaced {len(children)} workers with generation {store.info.get('generation')}")
+
+def serve(host: str = "127.0.0.1", port: int = 5000, workers: int = 0):
+    """
+    Run the API server in several worker processes sharing one store.
+
+    The parent loads the store once: the embedding matrix is memory-mapped
+    and the FAISS index and metadata are inherited copy-on-write by forked
+    workers, so adding workers does not add copies of the index. Each
+    worker loads its own embedding model after the fork. Workers that exit
+    unexpectedly are restarted.
+
+    The parent also watches for new store generations (every
+    RAG_RELOAD_INTERVAL seconds, or on SIGHUP, which /admin/reload sends).
+    It loads a new store once, then replaces the workers one at a time with
+    workers forked from it, so they keep sharing a single copy.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multi-worker mode requires os.fork (Linux or macOS)")
+    workers = workers or os.cpu_count() or 1
+
+    store = api_server.load_shared_store()
+    logger.info(f"Loaded {len(store.metadata)} chunks once for {workers} workers")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    # Keep the loaded objects out of the cyclic GC so collections in the
+    # workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+    children = {spawn_worker(sock, i, store): i for i in range(workers)}
+    stopping = False
+    reload_requested = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_reload(*_):
+        nonlocal reload_requested
+        reload_requested = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, request_reload)
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers")
+
+    reload_interval = api_server.RELOAD_INTERVAL
+    next_check = time.monotonic() + reload_interval
+    while children:
+        if not stopping and (reload_requested or (reload_interval > 0 and time.monotonic() >= next_check)):
+            reload_requested = False
+            next_check = time.monotonic() + reload_interval
+            new_store = reload_shared_store(store)
+            if new_store is not None:
+                store = new_store
+                # Free the old generation and freeze the new one before forking
+                gc.unfreeze()
+                gc.collect()
+                gc.freeze()
+                replace_workers(sock, children, store)
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        worker_id = children.pop(pid, None)
+        if worker_id is None or stopping:
+            continue
+        logger.warning(f"Worker {worker_id} (pid {pid}) exited with status {status}, restarting")
+        time.sleep(1)
+        children[spawn_worker(sock, worker_id, store)] = worker_id
+
+    sock.close()
+    logger.info("Server shutdown")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the RAG API server with multiple workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes (default: one per CPU core)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
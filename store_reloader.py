@@ -0,0 +1,86 @@
+import time
+import threading
+from typing import Optional
+from embedding_store import DEFAULT_STORE_DIR, store_generation
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger("store_reloader")
+
+class StoreReloader:
+    """
+    Hot-swaps new store generations into a running MemoryManager.
+
+    A background thread polls the generation in store.json every
+    poll_interval seconds and reloads when it changes; reload() can also be
+    called directly (e.g. from an admin endpoint). The new generation is
+    loaded and validated on the reloader's thread while searches keep
+    running on the old one, so requests never wait for a reload. A failed
+    load is logged and the current generation keeps serving.
+    """
+
+    def __init__(self, memory, directory: str = DEFAULT_STORE_DIR, poll_interval: float = 5.0):
+        self.memory = memory
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_reload_seconds: Optional[float] = None
+
+    def reload(self) -> bool:
+        """Load the store if its generation changed; True if a new one was swapped in."""
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                swapped = self.memory.reload_store(self.directory)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"Error reloading store from {self.directory}: {str(e)}")
+                raise
+            if swapped:
+                self.reloads += 1
+                self.last_error = None
+                self.last_reload_seconds = time.perf_counter() - start
+                logger.info(
+                    f"Reloaded store generation {self.memory.generation} "
+                    f"({len(self.memory.metadata)} chunks) in {self.last_reload_seconds:.2f}s"
+                )
+            return swapped
+
+    def start(self):
+        """Start watching the store directory for new generations."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="store-reloader", daemon=True)
+            self._thread.start()
+            logger.info(f"Watching {self.directory} for new store generations every {self.poll_interval}s")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            generation = store_generation(self.directory)
+            if generation is None or generation == self.memory.generation:
+                continue
+            try:
+                self.reload()
+            except Exception:
+                # Already logged; a store still being written is retried next poll
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.memory.generation,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_reload_seconds": self.last_reload_seconds,
+        }
@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.mock_embedder import MockEmbeddingBackend
+
+class CountingBackend(MockEmbeddingBackend):
+    """Mock embedder that records every text it embeds."""
+
+    def __init__(self):
+        super().__init__(dimension=32)
+        self.embedded = []
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_batch(texts)
+
+@pytest.fixture
+def backend():
+    return CountingBackend()
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a fresh directory holding scraped_texts/ with a few pages."""
+    monkeypatch.chdir(tmp_path)
+    SyntheticCorpus(seed=0).write_pages(str(tmp_path / "scraped_texts"), 12)
+    return tmp_path
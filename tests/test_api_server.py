@@ -0,0 +1,80 @@
+import pytest
+import api_server
+from api_server import app, parse_filters, parse_flag, parse_k, parse_min_score
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.mark.parametrize("filters", [
+    ["github.com"],
+    "github.com",
+    {"domains": [1]},
+    {"domains": {"github.com": True}},
+    {"url_prefix": 5},
+    {"visited_after": "not a date"},
+    {"visited_within_days": "7"},
+    {"visited_within_days": True},
+    {"unknown": 1},
+])
+def test_parse_filters_rejects_malformed_filters(filters):
+    with pytest.raises(ValueError):
+        parse_filters({"filters": filters})
+
+def test_parse_filters_accepts_valid_filters():
+    assert parse_filters({}) is None
+    assert parse_filters({"filters": {}}) is None
+    filters = parse_filters({"filters": {"domains": "github.com", "visited_within_days": 7}})
+    assert filters.domains == ["github.com"]
+    assert filters.visited_within_days == 7
+
+def test_parse_request_fields():
+    assert parse_min_score({"min_score": "0.25"}) == 0.25
+    assert parse_flag({"hybrid": False}, "hybrid", True) is False
+    assert parse_flag({}, "hybrid", True) is True
+    assert parse_k(0) == 1
+    assert parse_k(10**9) == api_server.MAX_K
+    for bad in ("abc", [1], True, "nan"):
+        with pytest.raises(ValueError):
+            parse_min_score({"min_score": bad})
+    for bad in ("false", 0, 1):
+        with pytest.raises(ValueError):
+            parse_flag({"hybrid": bad}, "hybrid", False)
+    for bad in ("5", 2.5, True):
+        with pytest.raises(ValueError):
+            parse_k(bad)
+
+@pytest.mark.parametrize("body", [
+    {"query": "rust", "filters": ["github.com"]},
+    {"query": "rust", "filters": {"domains": [1]}},
+    {"query": "rust", "min_score": "abc"},
+    {"query": "rust", "hybrid": "false"},
+    {"query": 5},
+    {"query": "   "},
+])
+def test_search_returns_400_for_invalid_requests(client, body):
+    response = client.post("/search", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+@pytest.mark.parametrize("body", [
+    {"queries": ["rust"], "filters": "github.com"},
+    {"queries": ["rust"], "k": "many"},
+    {"queries": ["rust"], "record_history": "no"},
+    {"queries": ["rust"] * (api_server.MAX_BATCH_QUERIES + 1)},
+])
+def test_search_batch_returns_400_for_invalid_requests(client, body):
+    response = client.post("/search/batch", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+@pytest.mark.parametrize("queries, bad_index", [
+    ([None, "rust"], 0),
+    (["rust", 5], 1),
+    (["rust", "faiss", ""], 2),
+    (["   "], 0),
+])
+def test_search_batch_rejects_non_string_and_blank_queries(client, queries, bad_index):
+    response = client.post("/search/batch", json={"queries": queries})
+    assert response.status_code == 400
+    assert f"Query {bad_index}" in response.get_json()["error"]
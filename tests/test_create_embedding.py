@@ -0,0 +1,67 @@
+import faiss
+from pathlib import Path
+from create_embedding import create_embeddings
+from embedding_store import DEFAULT_STORE_DIR, load_store, stored_index_config
+from file_manifest import load_manifest
+from index_factory import IndexConfig
+
+def store_rows(store):
+    """Every indexed (url, chunk) pair, including duplicates stored as references."""
+    rows = set()
+    for url, chunk, _, _, duplicates in store.metadata.rows():
+        rows.add((url, chunk))
+        rows.update((ref_url, chunk) for ref_url, _, _ in duplicates)
+    return rows
+
+def test_incremental_run_only_embeds_changed_files(workdir, backend):
+    create_embeddings(backend=backend, dedup="off")
+    assert len(load_manifest(DEFAULT_STORE_DIR)) == 12
+
+    pages = sorted(Path("scraped_texts").glob("*.txt"))
+    with open(pages[3], "a", encoding="utf-8") as f:
+        f.write("an appended line about zebras and quasars\n")
+    deleted_url = pages[5].read_text(encoding="utf-8").splitlines()[0][len("URL: "):]
+    pages[5].unlink()
+    new_page = Path("scraped_texts") / "page9999999.txt"
+    new_page.write_text(
+        "URL: https://new.example.com/page\n\nfresh page text about lighthouses\n",
+        encoding="utf-8"
+    )
+
+    backend.embedded.clear()
+    create_embeddings(backend=backend, dedup="off")
+    incremental = load_store(DEFAULT_STORE_DIR)
+    # Only the changed and the new file are embedded again
+    reembedded = len(backend.embedded)
+    changed_chunks = sum(1 for url, _ in store_rows(incremental) if url in {
+        pages[3].read_text(encoding="utf-8").splitlines()[0][len("URL: "):],
+        "https://new.example.com/page"
+    })
+    assert 0 < reembedded == changed_chunks
+    assert deleted_url not in {url for url, _ in store_rows(incremental)}
+    assert len(load_manifest(DEFAULT_STORE_DIR)) == 12
+
+    # The appended store holds the same chunks as a rebuild from scratch
+    create_embeddings(backend=backend, incremental=False, dedup="off")
+    rebuilt = load_store(DEFAULT_STORE_DIR)
+    assert store_rows(incremental) == store_rows(rebuilt)
+    assert incremental.index.ntotal == len(incremental.metadata) == len(incremental.keywords)
+
+def test_unchanged_files_are_not_embedded(workdir, backend):
+    create_embeddings(backend=backend)
+    generation = load_store(DEFAULT_STORE_DIR).info["generation"]
+
+    backend.embedded.clear()
+    create_embeddings(backend=backend)
+    assert backend.embedded == []
+    assert load_store(DEFAULT_STORE_DIR).info["generation"] == generation
+
+def test_full_rebuild_keeps_index_config(workdir, backend):
+    config = IndexConfig(index_type="hnsw", metric="cosine", hnsw_m=16, quantization="fp16", rerank_factor=4)
+    create_embeddings(backend=backend, index_config=config)
+
+    create_embeddings(backend=backend, incremental=False)
+    assert stored_index_config(DEFAULT_STORE_DIR) == config
+    store = load_store(DEFAULT_STORE_DIR)
+    assert isinstance(store.index, faiss.IndexHNSW)
+    assert store.index.metric_type == faiss.METRIC_INNER_PRODUCT
@@ -0,0 +1,114 @@
+import json
+import numpy as np
+import faiss
+from models import ChunkMetadata, ChunkRef
+from index_factory import IndexConfig
+from embedding_store import (
+    convert_json_store,
+    load_new_generation,
+    load_store,
+    save_store,
+    store_generation,
+    stored_index_config
+)
+from keyword_index import KeywordIndex
+
+def make_chunks(count):
+    chunks = []
+    for i in range(count):
+        duplicates = [ChunkRef(url=f"https://mirror.example.com/{i}", chunk_id=f"mirror{i}", visited_at=1700000000)] \
+            if i % 3 == 0 else []
+        chunks.append(ChunkMetadata(
+            url=f"https://site{i % 2}.example.com/page{i}",
+            chunk=f"chunk {i} about topic{i % 4} and ünïcode",
+            chunk_id=f"page{i}_0",
+            visited_at=1700000000 + i if i % 2 else None,
+            duplicates=duplicates
+        ))
+    return chunks
+
+def test_store_round_trip(tmp_path):
+    chunks = make_chunks(20)
+    embeddings = np.random.default_rng(0).standard_normal((20, 16)).astype(np.float32)
+    config = IndexConfig(index_type="hnsw", metric="cosine", hnsw_m=8, rerank_factor=4)
+    keywords = KeywordIndex.build(chunk.chunk for chunk in chunks)
+    info = save_store(str(tmp_path), embeddings, chunks, model_name="mock", index_config=config, keywords=keywords)
+
+    store = load_store(str(tmp_path))
+    assert isinstance(store.embeddings, np.memmap)
+    np.testing.assert_array_equal(store.embeddings, embeddings)
+    assert [store.metadata[i] for i in range(len(chunks))] == chunks
+    assert isinstance(store.metadata._text, np.memmap)
+    assert isinstance(store.metadata._offsets, np.memmap)
+    assert store.index.ntotal == 20
+    assert isinstance(store.index, faiss.IndexHNSW)
+    assert len(store.keywords) == 20
+    assert len(store.filter_index) == 20
+    assert store.filter_index.sorted_urls == sorted({chunk.url for chunk in chunks} | {
+        ref.url for chunk in chunks for ref in chunk.duplicates
+    })
+    assert store.index_config == config
+    assert stored_index_config(str(tmp_path)) == config
+    assert store.info["model_name"] == "mock"
+    assert store.info["generation"] == info["generation"] == store_generation(str(tmp_path))
+
+def test_flat_store_maps_vectors_once(tmp_path):
+    chunks = make_chunks(6)
+    embeddings = np.random.default_rng(1).standard_normal((6, 8)).astype(np.float32)
+    save_store(str(tmp_path), embeddings, chunks)
+
+    store = load_store(str(tmp_path))
+    # The vectors are read from the mapped flat index, not from embeddings.npy too
+    assert not isinstance(store.embeddings, np.memmap)
+    np.testing.assert_array_equal(store.embeddings, embeddings)
+    assert store.index.search(embeddings[2:3], 1)[1][0, 0] == 2
+
+    # Mapped columns are copied on the first change
+    extra = make_chunks(7)[6]
+    store.metadata.append(extra)
+    assert [store.metadata[i] for i in range(7)] == chunks + [extra]
+    assert [store.metadata[i] for i in range(6)] == [load_store(str(tmp_path)).metadata[i] for i in range(6)]
+
+def test_load_store_reads_legacy_metadata_jsonl(tmp_path):
+    chunks = make_chunks(4)
+    save_store(str(tmp_path), np.eye(4, dtype=np.float32), chunks)
+    info = json.loads((tmp_path / "store.json").read_text())
+    del info["has_metadata_columns"]
+    (tmp_path / "store.json").write_text(json.dumps(info))
+    with open(tmp_path / "metadata.jsonl", "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            row = [chunk.url, chunk.chunk, chunk.chunk_id,
+                   [[ref.url, ref.chunk_id, ref.visited_at] for ref in chunk.duplicates]]
+            if chunk.visited_at is not None:
+                row.append(chunk.visited_at)
+            f.write(json.dumps(row) + "\n")
+
+    store = load_store(str(tmp_path))
+    assert [store.metadata[i] for i in range(4)] == chunks
+
+def test_load_new_generation_skips_unchanged_store(tmp_path):
+    embeddings = np.ones((3, 4), dtype=np.float32)
+    info = save_store(str(tmp_path), embeddings, make_chunks(3))
+
+    assert load_new_generation(str(tmp_path), info["generation"]) is None
+    assert load_new_generation(str(tmp_path / "missing"), None) is None
+    store = load_new_generation(str(tmp_path), "older")
+    assert store.info["generation"] == info["generation"]
+
+def test_store_without_keywords_loads_lazily(tmp_path):
+    save_store(str(tmp_path), np.ones((3, 4), dtype=np.float32), make_chunks(3))
+    assert load_store(str(tmp_path)).keywords is None
+
+def test_convert_json_store_writes_keywords(tmp_path):
+    chunks = make_chunks(5)
+    json_path = tmp_path / "embeddings.json"
+    json_path.write_text(json.dumps({
+        "embeddings": np.eye(5, dtype=np.float32).tolist(),
+        "metadata": [chunk.dict() for chunk in chunks]
+    }))
+
+    info = convert_json_store(str(json_path), str(tmp_path / "store"))
+    assert info["has_keywords"]
+    store = load_store(str(tmp_path / "store"))
+    assert len(store.keywords) == 5
+    assert [store.metadata[i] for i in range(5)] == chunks
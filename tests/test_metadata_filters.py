@@ -0,0 +1,51 @@
+from datetime import datetime
+import numpy as np
+from models import ChunkMetadata, ChunkRef, SearchFilters
+from metadata_table import MetadataTable
+from metadata_filters import FilterIndex
+
+def make_metadata():
+    return MetadataTable([
+        ChunkMetadata(url="https://docs.python.org/3/a", chunk="a", chunk_id="a_0", visited_at=1000),
+        ChunkMetadata(
+            url="https://www.example.com/b", chunk="b", chunk_id="b_0", visited_at=2000,
+            duplicates=[
+                ChunkRef(url="https://github.com/x/b", chunk_id="gh_0", visited_at=3000),
+                ChunkRef(url="https://gitlab.com/y/b", chunk_id="gl_0"),
+            ]
+        ),
+        ChunkMetadata(url="https://github.com/z/c", chunk="c", chunk_id="c_0"),
+    ])
+
+FILTERS = [
+    SearchFilters(domains=["github.com"]),
+    SearchFilters(domains=["python.org"]),
+    SearchFilters(url_prefix="https://github.com/x"),
+    SearchFilters(visited_after=datetime.fromtimestamp(1500)),
+    SearchFilters(domains=["example.com"], visited_before=datetime.fromtimestamp(2500)),
+]
+
+def test_saved_filter_index_matches_built_one(tmp_path):
+    metadata = make_metadata()
+    built = FilterIndex.build(metadata)
+    built.save(str(tmp_path / "filters.npz"))
+    loaded = FilterIndex.load(str(tmp_path / "filters.npz"), metadata)
+
+    assert len(loaded) == 3
+    assert loaded.sorted_urls == built.sorted_urls
+    for filters in FILTERS:
+        np.testing.assert_array_equal(loaded.matching(filters), built.matching(filters))
+    np.testing.assert_array_equal(loaded.matching(FILTERS[0]), [False, True, True])
+
+def test_resolve_swaps_the_matching_duplicate_out_of_duplicates():
+    metadata = make_metadata()
+    index = FilterIndex.build(metadata)
+    meta = metadata[1]
+
+    resolved = index.resolve(meta, SearchFilters(domains=["github.com"]))
+    assert (resolved.url, resolved.chunk_id, resolved.visited_at) == ("https://github.com/x/b", "gh_0", 3000)
+    assert resolved.duplicates == [
+        ChunkRef(url="https://www.example.com/b", chunk_id="b_0", visited_at=2000),
+        ChunkRef(url="https://gitlab.com/y/b", chunk_id="gl_0"),
+    ]
+    assert index.resolve(meta, SearchFilters(domains=["example.com"])) is meta
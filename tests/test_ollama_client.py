@@ -0,0 +1,137 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+import requests
+from embedding_backends import OllamaBackend
+from ollama_client import OllamaEmbeddingClient
+
+class StubOllama(ThreadingHTTPServer):
+    """
+    Local stand-in for the Ollama API.
+
+    A text "3" embeds to [3, 1]. Texts containing "bad" get a 400,
+    fail_next requests get a 500 and batch_endpoint=False answers
+    /api/embed with 404 like servers older than the batch API.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.batch_endpoint = True
+        self.fail_next = 0
+        self.paths = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so pooled connections are reused
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.paths.append(self.path)
+            server.connections.add(self.client_address)
+            failing = server.fail_next > 0
+            server.fail_next -= failing
+
+        texts = body["input"] if self.path == "/api/embed" else [body["prompt"]]
+        if failing:
+            self.reply(500, {"error": "busy"})
+        elif self.path == "/api/embed" and not server.batch_endpoint:
+            self.reply(404, {"error": "not found"})
+        elif any("bad" in text for text in texts):
+            self.reply(400, {"error": "bad input"})
+        elif self.path == "/api/embed":
+            self.reply(200, {"embeddings": [self.vector(text) for text in texts]})
+        else:
+            self.reply(200, {"embedding": self.vector(texts[0])})
+
+    def vector(self, text):
+        return [float(text.split()[-1]), 1.0]
+
+    def reply(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(stub):
+    client = OllamaEmbeddingClient(stub.url, max_concurrency=2, batch_size=3, backoff=0.01)
+    yield client
+    client.close()
+
+def expected(count):
+    return np.array([[i, 1.0] for i in range(count)], dtype=np.float32)
+
+def test_batches_share_pooled_connections(stub, client):
+    for _ in range(3):
+        np.testing.assert_array_equal(client.embed_batch([str(i) for i in range(10)]), expected(10))
+
+    assert stub.paths == ["/api/embed"] * 12
+    # Keep-alive sessions: never more connections than max_concurrency
+    assert len(stub.connections) <= 2
+    assert client.throughput_report()["texts_embedded"] == 30
+
+def test_server_errors_are_retried_with_backoff(stub, client):
+    stub.fail_next = 2
+    np.testing.assert_array_equal(client.embed_batch(["0", "1"]), expected(2))
+    assert client.retries == 2
+    assert client.requests_sent == 3
+
+    stub.fail_next = client.max_retries + 1
+    with pytest.raises(requests.HTTPError):
+        client.embed("0")
+    assert client.retries == 2 + client.max_retries
+
+def test_client_errors_are_not_retried(stub, client):
+    with pytest.raises(requests.HTTPError):
+        client.embed_batch(["0", "bad 1"])
+    assert stub.paths == ["/api/embed"]
+    assert client.retries == 0
+
+def test_falls_back_to_single_requests_without_batch_endpoint(stub, client):
+    stub.batch_endpoint = False
+    np.testing.assert_array_equal(client.embed_batch([str(i) for i in range(5)]), expected(5))
+    assert stub.paths == ["/api/embed"] + ["/api/embeddings"] * 5
+
+    # The fallback is remembered: later batches skip /api/embed
+    np.testing.assert_array_equal(client.embed_batch(["0", "1"]), expected(2))
+    assert stub.paths.count("/api/embed") == 1
+
+def test_history_script_skips_failing_chunks(stub, tmp_path, monkeypatch):
+    import faiss_history_search_ollama as script
+
+    for name, body in [("a", "good 0"), ("b", "bad 1"), ("c", "good 2")]:
+        (tmp_path / f"{name}.txt").write_text(f"URL: https://example.com/{name}\n\n{body}\n")
+    backend = OllamaBackend(base_url=stub.url, max_concurrency=2, max_batch_size=3)
+    monkeypatch.setattr(script, "SCRAPED_TEXTS_PATH", tmp_path)
+    monkeypatch.setattr(script, "backend", backend)
+    try:
+        embeddings, metadata = script.process_scraped_files()
+    finally:
+        backend.client.close()
+
+    assert sorted(meta["chunk"] for meta in metadata) == ["good 0", "good 2"]
+    for embedding, meta in zip(embeddings, metadata):
+        assert embedding[0] == float(meta["chunk"].split()[-1])
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import signal
+import socket
+import sqlite3
+import threading
+import urllib.request
+from contextlib import contextmanager
+from functools import partial
+import pytest
+import api_server
+import memory
+import serve
+from create_embedding import create_embeddings
+from embedding_store import DEFAULT_STORE_DIR, load_store
+from history_journal import HistoryJournal
+from benchmarks.mock_embedder import MockEmbeddingBackend
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py workers need os.fork")
+
+@pytest.fixture
+def store(workdir, backend, monkeypatch):
+    """A mock-embedded store; workers forked afterwards embed queries with the same mock."""
+    create_embeddings(backend=backend, dedup="off")
+    monkeypatch.setattr(api_server, "get_backend", lambda *args, **kwargs: MockEmbeddingBackend(dimension=32))
+    return load_store(DEFAULT_STORE_DIR)
+
+@contextmanager
+def forked_worker(store):
+    """Fork one serve.py worker on a local port; yields (pid, base url)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    sock.set_inheritable(True)
+    pid = serve.spawn_worker(sock, 0, store)
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    try:
+        wait_until_serving(url)
+        yield pid, url
+    finally:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        sock.close()
+
+def wait_until_serving(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url + "/health", timeout=5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+def post(url, body):
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, json.loads(response.read())
+
+def stop(pid):
+    """SIGTERM a worker and return its exit status."""
+    os.kill(pid, signal.SIGTERM)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+def test_sigterm_finishes_requests_in_flight(store, monkeypatch):
+    execute_search = api_server.execute_search
+
+    def slow_search(*args, **kwargs):
+        time.sleep(1)
+        return execute_search(*args, **kwargs)
+
+    # Patched before the fork, so the worker inherits it
+    monkeypatch.setattr(api_server, "execute_search", slow_search)
+    with forked_worker(store) as (pid, url):
+        replies = []
+        request = threading.Thread(target=lambda: replies.append(post(url + "/search", {"query": "slow search"})))
+        request.start()
+        time.sleep(0.3)
+        assert stop(pid) == 0
+        request.join(timeout=30)
+    status, body = replies[0]
+    assert status == 200
+    assert len(body["results"]) == 3
+
+def test_worker_exit_flushes_history_and_query_cache(store, monkeypatch):
+    # A long flush interval leaves the entry queued until the worker closes the journal
+    monkeypatch.setattr(memory, "HistoryJournal", partial(HistoryJournal, flush_interval=60))
+    with forked_worker(store) as (pid, url):
+        status, body = post(url + "/search", {"query": "journal entry query"})
+        assert status == 200
+        assert stop(pid) == 0
+
+    with open("search_history.jsonl", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["query"] for entry in entries] == ["journal entry query"]
+    with sqlite3.connect(api_server.QUERY_CACHE_PATH) as db:
+        assert db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 1